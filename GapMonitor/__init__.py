@@ -0,0 +1,22 @@
+import json
+import logging
+import os
+
+import azure.functions as func
+
+
+def main(timer: func.TimerRequest) -> None:
+    '''
+    Every 5 minutes: brings the coverage index of every table of
+    table_column_map, or of MONITOR_TABLES, up to now. HttpTrigger1 answers
+    engine=monitor from that state.
+    '''
+    # the data stack is only loaded by the tick, like HttpTrigger1 loads it per request
+    from shared_code.services.gap_monitor import monitor_tick
+
+    if timer.past_due:
+        logging.info('Gap monitor tick is past due')
+
+    tables = os.getenv('MONITOR_TABLES')
+    for report in monitor_tick(tables.split(',') if tables else None):
+        logging.info(f'Gap monitor: {json.dumps(report)}')
@@ -1,24 +1,138 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+
 import azure.functions as func
-from .services.report_ronding_time import run
+from shared_code.services.validation import engines, key_engines, outputs, formats, error_reports
+
+
+# the data stack (pandas, polars, psycopg2) and the database connection are only
+# loaded when a request needs them, the first invocation starts loading them in
+# the background while it is validated. DB_PREWARM=0 turns that off.
+prewarm_enabled = os.getenv('DB_PREWARM', '1').lower() in ('1', 'true', 'yes')
+prewarm_thread = None
+prewarm_lock = threading.Lock()
+# set once the imports are done and a connection waits in the pool
+prewarm_ready = threading.Event()
+# set when the first request is answered and its connection is back in the pool
+request_done = threading.Event()
+
+
+def prewarm():
+    try:
+        from shared_code.services import report_ronding_time  # noqa: F401
+        from shared_code.common.db import connection
+        # the reports run on pooled connections, so the connection is checked into the pool
+        with connection.pooled_connect():
+            connection.start_connect()
+    except Exception as e:
+        logging.warning(f"Prewarm failed, the request will connect itself: {e}")
+        return
+    finally:
+        prewarm_ready.set()
+
+    try:
+        # one catalog query fills the metadata cache for every table of the schema. The
+        # gap reports do not read it, so it waits for the first request to give the
+        # connection back instead of holding it or opening a second one
+        request_done.wait()
+        with connection.pooled_connect():
+            connection.warm_metadata()
+    except Exception as e:
+        logging.warning(f"Prewarm could not load the table metadata: {e}")
+
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
-    table_times = req.params.get('table_times')
+def start_prewarm():
+    global prewarm_thread
+    with prewarm_lock:
+        if prewarm_thread is None:
+            prewarm_thread = threading.Thread(target=prewarm, name='prewarm', daemon=True)
+            prewarm_thread.start()
 
-    
-    if not table_times:
+
+def wait_prewarm():
+    # the request must not open a second connection while the prewarm opens the first one
+    if prewarm_thread is not None:
+        prewarm_ready.wait()
+
+
+def get_param(req: func.HttpRequest, name: str, default=None):
+    value = req.params.get(name)
+
+    if not value:
         try:
             req_body = req.get_json()
-    
+
         except ValueError:
             pass
         else:
-            table_times = req_body.get('table_times')
+            value = req_body.get(name)
+
+    return default if value is None or value == '' else value
+
+
+def get_flag(req: func.HttpRequest, name: str, default: bool = False) -> bool:
+    return str(get_param(req, name, default)).lower() in ('1', 'true', 'yes')
+
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    if prewarm_enabled:
+        start_prewarm()
+
+    table_times = get_param(req, 'table_times')
+    engine = get_param(req, 'engine', 'python')
+    concurrent = get_flag(req, 'concurrent')
+    output = get_param(req, 'output', 'list')
+    use_cache = get_flag(req, 'cache', True)
+    cache_stats = get_flag(req, 'cache_stats')
+    timings = get_flag(req, 'timings')
+    by_key = get_flag(req, 'by_key')
+    stream = get_flag(req, 'stream')
+    fmt = get_param(req, 'format', 'json')
+    mimetype = "application/x-ndjson" if stream and fmt == 'ndjson' else "application/json"
+    errors = error_reports(table_times, by_key) if table_times and not cache_stats else None
+
+    if engine not in engines:
+        result = f"Unknown engine {engine}, please pass one of {', '.join(engines)}"
+
+    elif output not in outputs:
+        result = f"Unknown output {output}, please pass one of {', '.join(outputs)}"
+
+    elif fmt not in formats:
+        result = f"Unknown format {fmt}, please pass one of {', '.join(formats)}"
+
+    elif by_key and engine not in key_engines:
+        result = f"Engine {engine} has no by_key mode, please pass one of {', '.join(key_engines)}"
+
+    elif errors is not None:
+        # nothing to scan, same body as run() / stream_report() without touching the data stack
+        if stream and fmt == 'ndjson':
+            result = ''.join(json.dumps(report) + '\n' for report in errors)
+        else:
+            result = json.dumps({"table_times": errors})
+
+    elif table_times and stream:
+        # main runs on the worker's event loop, blocking work goes to a thread
+        await asyncio.to_thread(wait_prewarm)
+        from shared_code.services.report_ronding_time import stream_report
+        # the v1 worker has no streamed response: the chunks are joined into the
+        # whole body, so the client gets nothing before the last table and the
+        # body is held in full, only the per table slots are freed early
+        result = await asyncio.to_thread(
+            lambda: ''.join(stream_report(table_times, fmt=fmt, engine=engine, concurrent=concurrent, output=output,
+                                          use_cache=use_cache, cache_stats=cache_stats, timings=timings,
+                                          by_key=by_key)))
 
-    if table_times:
-        result = run(table_times)
+    elif table_times:
+        await asyncio.to_thread(wait_prewarm)
+        from shared_code.services.report_ronding_time import run_async
+        result = await run_async(table_times, engine=engine, concurrent=concurrent, output=output,
+                                 use_cache=use_cache, cache_stats=cache_stats, timings=timings, by_key=by_key)
 
     else:
         result = "Please pass a table_times on the query string or in the request body"
-        
-    return func.HttpResponse(result, mimetype="application/json")
 
+    request_done.set()
+    return func.HttpResponse(result, mimetype=mimetype)
@@ -0,0 +1,107 @@
+'''
+Cold start of the function app: every measurement runs in a fresh interpreter
+and is repeated `--repeat` times, one JSON line per measurement with the git
+commit so runs can be compared across commits.
+
+    python benchmarks/bench_cold_start.py
+
+import_function   import HttpTrigger1, what the worker does before the first call
+import_full_stack import HttpTrigger1 plus the gap report service (pandas, polars, psycopg2)
+invalid_request   import HttpTrigger1 and answer a TABLE NOT FOUND request, prewarm off
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# each snippet prints the seconds it took and the heavy modules that ended up loaded
+snippets = {
+    'import_function': '''
+import time
+time_start = time.perf_counter()
+import HttpTrigger1
+elapsed = time.perf_counter() - time_start
+''',
+    'import_full_stack': '''
+import time
+time_start = time.perf_counter()
+import HttpTrigger1
+import shared_code.services.report_ronding_time
+elapsed = time.perf_counter() - time_start
+''',
+    'invalid_request': '''
+import time
+time_start = time.perf_counter()
+import asyncio
+import json
+import azure.functions as func
+import HttpTrigger1
+body = json.dumps({"table_times": {"NOPE": {"start_datetime": "2021-01-01 00:00:00.000000",
+                                            "end_datetime": "2021-01-02 00:00:00.000000"}}}).encode()
+response = asyncio.run(HttpTrigger1.main(func.HttpRequest(method="POST", url="/api/HttpTrigger1", body=body)))
+assert b"TABLE NOT FOUND" in response.get_body()
+elapsed = time.perf_counter() - time_start
+''',
+}
+
+report = '''
+import json, sys
+print(json.dumps({"elapsed": elapsed,
+                  "loaded": sorted(name for name in ("pandas", "polars", "numpy", "psycopg2") if name in sys.modules)}))
+'''
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, cwd=root).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_snippet(code):
+    env = dict(os.environ, DB_PREWARM='0')
+    out = subprocess.check_output([sys.executable, '-c', code + report], cwd=root, env=env, text=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='append the JSON lines to this file instead of stdout')
+    args = parser.parse_args()
+
+    context = {
+        'commit': git_commit(),
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+    }
+    output = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        for stage, code in snippets.items():
+            # one warm-up run so the timings do not include compiling the bytecode cache
+            run_snippet(code)
+            runs = [run_snippet(code) for _ in range(args.repeat)]
+            timings = [run['elapsed'] for run in runs]
+            record = dict(context,
+                          stage=stage,
+                          latency_min_s=min(timings),
+                          latency_median_s=statistics.median(timings),
+                          latency_max_s=max(timings),
+                          loaded_modules=runs[-1]['loaded'])
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
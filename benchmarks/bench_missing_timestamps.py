@@ -0,0 +1,67 @@
+'''
+Compare the vectorized calculate_missing_timestamps with the original set based
+implementation on synthetic windows.
+
+    python benchmarks/bench_missing_timestamps.py
+'''
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared_code.services.report_ronding_time import (  # noqa: E402
+    calculate_missing_timestamps, calculate_missing_timestamps_set)
+from shared_code.services.timestamp_slots import frequency_step_map  # noqa: E402
+
+windows = [
+    ('1 day', datetime.timedelta(days=1)),
+    ('30 days', datetime.timedelta(days=30)),
+    ('365 days', datetime.timedelta(days=365)),
+]
+
+
+def make_rows(frequency, start, end, gap_ratio=0.01, seed=0):
+    rng = random.Random(seed)
+    step = frequency_step_map[frequency]
+    # 30min tables store LASTCHANGED a few minutes after the slot
+    offset = datetime.timedelta(minutes=7) if frequency == '30min' else datetime.timedelta(0)
+    rows = []
+    slot = start
+    while slot <= end:
+        if rng.random() >= gap_ratio:
+            rows.append((slot + offset,))
+        slot += step
+    return rows
+
+
+def best_of(func, repeat, *args):
+    timings = []
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        out = func(*args)
+        timings.append(time.perf_counter() - time_start)
+    return min(timings), out
+
+
+def main(repeat=3):
+    start = datetime.datetime(2021, 1, 1)
+    print(f"{'frequency':<10}{'window':<10}{'slots':>8}{'set (s)':>12}{'vectorized (s)':>16}{'speedup':>10}")
+    for frequency in frequency_step_map:
+        for label, length in windows:
+            end = start + length
+            rows = make_rows(frequency, start, end)
+            args = (rows, frequency, start.strftime('%Y-%m-%d %H:%M:%S.%f'), end.strftime('%Y-%m-%d %H:%M:%S.%f'))
+
+            set_time, set_out = best_of(calculate_missing_timestamps_set, repeat, *args)
+            vec_time, vec_out = best_of(calculate_missing_timestamps, repeat, *args)
+            assert sorted(set_out) == vec_out, f"results differ for {frequency} {label}"
+
+            slots = int(length / frequency_step_map[frequency]) + 1
+            print(f"{frequency:<10}{label:<10}{slots:>8}{set_time:>12.4f}{vec_time:>16.4f}{set_time / vec_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+'''
+End to end benchmark of the gap report pipeline against a PostgreSQL seeded with
+synthetic NEM style tables. Connects with the same DB_* environment variables as
+the function app and writes one JSON line per measurement, tagged with the git
+commit, so runs can be compared across commits.
+
+    # seed the tables of table_column_map into "DBO" (drops and recreates them)
+    python benchmarks/bench_pipeline.py --seed --years 3 --gap-density 0.01
+
+    # measure, appending to a results file
+    python benchmarks/bench_pipeline.py --output benchmarks/results.jsonl
+
+Every (frequency, window, stage) is timed `--repeat` times for latency and
+throughput (grid slots per second), then run once more under tracemalloc for the
+peak Python heap. tracemalloc does not see the native buffers of polars, the
+process high-water mark is reported next to it as `max_rss_kb`.
+'''
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import polars as pl  # noqa: E402
+from shared_code.common.db import connection  # noqa: E402
+from shared_code.repository.dbo_transactions import query_timestamp, frequency_interval_map  # noqa: E402
+from shared_code.services.report_ronding_time import (  # noqa: E402
+    table_column_map, calculate_missing_timestamps, run)
+from shared_code.services.timestamp_slots import frequency_step_map  # noqa: E402
+from shared_code.services.validation import table_key_map  # noqa: E402
+
+
+seed_start = datetime.datetime(2021, 1, 1)
+
+windows = {
+    '1h': datetime.timedelta(hours=1),
+    '1d': datetime.timedelta(days=1),
+    '7d': datetime.timedelta(days=7),
+    '30d': datetime.timedelta(days=30),
+    '1y': datetime.timedelta(days=365),
+    '3y': datetime.timedelta(days=3 * 365),
+}
+
+# one table per frequency is measured, the seed covers all of table_column_map
+bench_tables = {
+    '5min': 'PRICE',
+    '30min': 'PREDISPATCHPRICE',
+    'H': 'STPASA_REGIONSOLUTION',
+}
+
+local_hosts = ('localhost', '127.0.0.1', '::1')
+
+
+def seed_table(table_name, column, frequency, end, keys, gap_density):
+    '''
+    Recreate one table with a row per key and slot between seed_start and end.
+    A slot is dropped for every key with probability gap_density, 30min tables
+    store their rows 7 minutes after the slot like LASTCHANGED does.
+    '''
+    offset = '7 minutes' if frequency == '30min' else '0 minutes'
+    key = table_key_map[table_name]
+    prefix = 'NSW' if key == 'REGIONID' else 'IC'
+    key_values = ', '.join(f"'{prefix}{index}'" for index in range(1, keys + 1))
+    connection.executeSQL(f'DROP TABLE IF EXISTS "DBO"."{table_name}"', is_result=False)
+    connection.executeSQL(f'CREATE TABLE "DBO"."{table_name}" ("{column}" timestamp NOT NULL, "{key}" text NOT NULL, "VALUE" float8)',
+                          is_result=False)
+    connection.executeSQL(f'''
+        INSERT INTO "DBO"."{table_name}"
+        SELECT slot + interval '{offset}', key, random()
+        FROM (
+            SELECT slot FROM generate_series(%s::timestamp, %s::timestamp, interval '{frequency_interval_map[frequency]}') AS slot
+            WHERE random() >= %s
+        ) AS slots
+        CROSS JOIN unnest(ARRAY[{key_values}]) AS key
+    ''', [seed_start, end, gap_density], is_result=False)
+    # the key rides along so the per key scan of by_key requests can read the index only
+    connection.executeSQL(f'CREATE INDEX ON "DBO"."{table_name}" ("{column}", "{key}")', is_result=False)
+    connection.executeSQL(f'ANALYZE "DBO"."{table_name}"', is_result=False)
+
+
+def seed(years, keys, gap_density, seed_value, force=False):
+    host = os.getenv('DB_HOST') or 'localhost'
+    if not (force or host in local_hosts or host.startswith('/')):
+        raise SystemExit(f'refusing to seed non local host {host}, pass --force to do it anyway')
+
+    end = seed_start + datetime.timedelta(days=365 * years)
+    connection.executeSQL('CREATE SCHEMA IF NOT EXISTS "DBO"', is_result=False)
+    connection.executeSQL('SELECT setseed(%s)', [seed_value])
+    for table_name, (column, frequency) in table_column_map.items():
+        time_start = time.perf_counter()
+        seed_table(table_name, column, frequency, end, keys, gap_density)
+        print(f'seeded {table_name} in {time.perf_counter() - time_start:.1f}s', file=sys.stderr)
+
+    # the coverage index describes the tables that were just dropped
+    connection.executeSQL('DROP TABLE IF EXISTS "DBO"."COVERAGE_INDEX"', is_result=False)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def to_string(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def stages(table_name, column, frequency, start, end, engines):
+    '''
+    name -> zero argument callable for every stage measured on one window.
+    '''
+    start_timestamp, end_timestamp = to_string(start), to_string(end)
+    rows = query_timestamp(column, table_name, start_timestamp, end_timestamp, as_frame=True)
+    table_times = {table_name: {'start_datetime': start_timestamp, 'end_datetime': end_timestamp}}
+
+    out = {
+        'query_timestamp': lambda: query_timestamp(column, table_name, start_timestamp, end_timestamp, as_frame=True),
+        'calculate_missing_timestamps': lambda: calculate_missing_timestamps(rows, frequency, start_timestamp, end_timestamp),
+    }
+    for engine in engines:
+        out[f'run:{engine}'] = lambda engine=engine: run(table_times, engine=engine, use_cache=False)
+    return out
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - time_start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', action='store_true', help='(re)create and fill the tables, then exit')
+    parser.add_argument('--force', action='store_true', help='allow --seed on a host that is not local')
+    parser.add_argument('--years', type=float, default=3,
+                        help='seeded span from 2021-01-01, longer windows are skipped when measuring')
+    parser.add_argument('--keys', type=int, default=2, help='regions or interconnectors per slot')
+    parser.add_argument('--gap-density', type=float, default=0.01, help='probability that a slot is missing')
+    parser.add_argument('--seed-value', type=float, default=0.42, help='setseed() value for a reproducible seed')
+    parser.add_argument('--windows', default=','.join(windows), help='comma separated subset of ' + ', '.join(windows))
+    parser.add_argument('--frequencies', default=','.join(bench_tables))
+    parser.add_argument('--engines', default='python,sql,stream')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='append the JSON lines to this file instead of stdout')
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.years, args.keys, args.gap_density, args.seed_value, args.force)
+        return
+
+    logging.disable(logging.WARNING)
+    context = {
+        'commit': git_commit(),
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'polars': pl.__version__,
+        'repeat': args.repeat,
+    }
+    output = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        for frequency in args.frequencies.split(','):
+            table_name = bench_tables[frequency]
+            column = table_column_map[table_name][0]
+            for label in args.windows.split(','):
+                length = windows[label]
+                if length > datetime.timedelta(days=365 * args.years):
+                    continue
+                start, end = seed_start, seed_start + length
+                slots = length // frequency_step_map[frequency] + 1
+                for stage, func in stages(table_name, column, frequency, start, end, args.engines.split(',')).items():
+                    timings, peak = measure(func, args.repeat)
+                    median = statistics.median(timings)
+                    record = dict(context,
+                                  stage=stage,
+                                  table=table_name,
+                                  frequency=frequency,
+                                  window=label,
+                                  slots=slots,
+                                  latency_min_s=min(timings),
+                                  latency_median_s=median,
+                                  latency_max_s=max(timings),
+                                  slots_per_s=slots / median if median else None,
+                                  tracemalloc_peak_bytes=peak,
+                                  max_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+                    output.write(json.dumps(record) + '\n')
+                    output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
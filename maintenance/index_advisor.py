@@ -0,0 +1,64 @@
+'''
+Index advisor for the timestamp columns of table_column_map. Connects with the
+same DB_* environment variables as the function app and writes one JSON line
+per table: its indexes, whether the gap queries over the window plan a
+sequential scan, their estimated (and with --analyze actual) cost, and the
+index they need.
+
+    # report only, plans of the last 30 days
+    python maintenance/index_advisor.py
+
+    # run the queries for actual times, build the missing indexes and report again
+    python maintenance/index_advisor.py --analyze --create --tables PREDISPATCHPRICE,P5MIN_REGIONSOLUTION
+
+--create builds with CREATE INDEX CONCURRENTLY, writes to the table go on while
+it runs, then VACUUM (ANALYZE)s the table so the planner can use index-only scans.
+'''
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared_code.services.index_advisor import advise  # noqa: E402
+from shared_code.services.validation import table_column_map  # noqa: E402
+
+
+def to_string(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', help='comma separated subset of table_column_map, default every table')
+    parser.add_argument('--end', help='window end, YYYY-MM-DD HH:MM:SS.ffffff, default now')
+    parser.add_argument('--days', type=float, default=30, help='window length before --end')
+    parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE, runs the queries')
+    parser.add_argument('--create', action='store_true', help='create the recommended indexes that are missing')
+    parser.add_argument('--output', help='append the JSON lines to this file instead of stdout')
+    args = parser.parse_args()
+
+    table_names = args.tables.split(',') if args.tables else None
+    unknown = [table_name for table_name in table_names or [] if table_name not in table_column_map]
+    if unknown:
+        raise SystemExit(f"unknown tables {', '.join(unknown)}, expected some of {', '.join(table_column_map)}")
+
+    end = datetime.datetime.strptime(args.end, '%Y-%m-%d %H:%M:%S.%f') if args.end else datetime.datetime.now()
+    start = end - datetime.timedelta(days=args.days)
+
+    logging.disable(logging.WARNING)
+    output = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        for report in advise(to_string(start), to_string(end), table_names, analyze=args.analyze, create=args.create):
+            output.write(json.dumps(report) + '\n')
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+import asyncpg
+
+from .database_Util import numbered_placeholders
+from .metrics import stage, count
+from .retry_policy import RetryPolicy, CircuitBreaker, CircuitOpenError
+
+
+logger = logging.getLogger(__name__)
+
+# errors after which the same statement can succeed on a fresh connection
+transient_errors = (asyncpg.PostgresConnectionError, asyncpg.InterfaceError,
+                    asyncpg.CannotConnectNowError, ConnectionError, OSError, asyncio.TimeoutError)
+
+
+class AsyncDatabaseUtil:
+    '''
+    asyncio counterpart of DatabaseUtil on asyncpg. Statements are awaited on a
+    connection checked out of an asyncpg pool of at most `max_pool_size`
+    connections, so one event loop can have that many queries in flight.
+
+    asyncpg pools belong to the event loop that created them, the pool is
+    created on first use and again when it is used from another loop.
+    '''
+
+    def __init__(self,
+                 username: str,
+                 password: str,
+                 host: str,
+                 database: str,
+                 port: int = 5432,
+                 table_schema: str = 'public',
+                 max_to_try: int = 3,
+                 sleep_time: int = 5,
+                 max_pool_size: int = 4,
+                 command_timeout: float = None,
+                 retry_policy: RetryPolicy = None,
+                 circuit_breaker: CircuitBreaker = None):
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = int(port)
+        self.database = database
+        self.table_schema = table_schema
+
+        self.max_to_try = max(max_to_try, 1)
+        self.retry_policy = retry_policy or RetryPolicy(max_delay=sleep_time)
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+        self.max_pool_size = max(int(max_pool_size), 1)
+        self.command_timeout = command_timeout
+
+        self.pool = None
+        self.pool_loop = None
+
+        self.info = logger.info
+        self.error = logger.error
+
+    def sql_prep(self, sql_cmd: str) -> str:
+        # the repository writes %s placeholders like psycopg2, asyncpg wants $1, $2, ...
+        # asyncpg prepares and caches each statement per connection itself, keyed by this text
+        return numbered_placeholders(sql_cmd)
+
+    async def get_pool(self):
+        loop = asyncio.get_running_loop()
+        if self.pool is None or self.pool_loop is not loop:
+            # connections are opened on acquire through self.connect, where the circuit breaker sees them
+            self.pool = await asyncpg.create_pool(
+                connect=self.connect,
+                user=self.username,
+                password=self.password,
+                host=self.host,
+                port=self.port,
+                database=self.database,
+                min_size=0,
+                max_size=self.max_pool_size,
+                command_timeout=self.command_timeout,
+            )
+            self.pool_loop = loop
+        return self.pool
+
+    async def close_pool(self):
+        if self.pool is not None and self.pool_loop is asyncio.get_running_loop():
+            await self.pool.close()
+        self.pool = self.pool_loop = None
+
+    async def connect(self, *args, **kwargs):
+        # the pool opens its new connections here, an idle connection it hands
+        # back tells nothing about the database and never reaches the breaker
+        if not self.circuit_breaker.allow():
+            raise CircuitOpenError('Database marked down, not connecting until the circuit breaker resets.')
+        try:
+            conn = await asyncpg.connect(*args, **kwargs)
+        except BaseException:
+            # also a cancel or an auth error, a half open trial that is never
+            # recorded would keep the shared breaker open for good
+            self.circuit_breaker.record_failure()
+            raise
+        self.circuit_breaker.record_success()
+        return conn
+
+    @asynccontextmanager
+    async def pooled_connect(self):
+        pool = await self.get_pool()
+        with stage('connect'):
+            conn = await pool.acquire()
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    async def fetch(self, sql_cmd: str, params=None):
+        '''
+        Run one statement and return its rows as asyncpg Records. Connection
+        errors are retried on a fresh pooled connection with the retry policy's
+        backoff, any other database error is raised at once.
+        '''
+        sql_cmd = self.sql_prep(sql_cmd)
+        params = list(params or [])
+        retry_started = time.monotonic()
+        for try_con in range(1, self.max_to_try + 1):
+            try:
+                time_start = time.perf_counter()
+                async with self.pooled_connect() as conn:
+                    # asyncpg decodes while it reads, there is no separate fetch stage
+                    with stage('query'):
+                        rows = await conn.fetch(sql_cmd, *params)
+                count('rows', len(rows))
+                self.info(f"Done fetch {len(rows)} rows, time elapsed {timedelta(seconds=time.perf_counter() - time_start)}")
+                return rows
+            except CircuitOpenError:
+                raise
+            except transient_errors as e:
+                self.error(f"Error : {e}")
+                if try_con >= self.max_to_try:
+                    break
+                if not await self.retry_policy.sleep_async(try_con, retry_started):
+                    self.info(f"Retry deadline of {self.retry_policy.deadline} seconds exceeded. [{try_con}/{self.max_to_try}]")
+                    break
+                self.info(f"Trying again. [{try_con + 1}/{self.max_to_try}]")
+        raise ConnectionError("Failed to connect database")
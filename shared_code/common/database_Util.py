@@ -0,0 +1,1215 @@
+import csv
+import datetime
+import decimal
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO, StringIO
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
+import psycopg2 as dbconnecter
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.extras import execute_batch, execute_values
+
+from .lazy_query import LazyQuery, quote_identifier
+from .metrics import stage, count
+from .retry_policy import RetryPolicy, CircuitBreaker, CircuitOpenError
+
+
+logger = logging.getLogger(__name__)
+
+
+class Singleton(type):
+
+    def __init__(cls, name, bases, dict):
+        super(Singleton, cls).__init__(name, bases, dict)
+        cls._instance = None
+
+    def __call__(cls, *args, **kw):
+        if cls._instance is None:
+            cls._instance = super(Singleton, cls).__call__(*args, **kw)
+
+        return cls._instance
+
+    def reset_singleton(cls):
+        cls._instance = None
+
+
+class DatabaseUtil(metaclass=Singleton):
+
+    def __init__(self,
+                 username: str,
+                 password: str,
+                 host: str,
+                 database: str,
+                 port: int = 5432,
+                 table_schema: str = 'public',
+                 autocommit=True,
+                 max_to_try: int = 3,
+                 sleep_time: int = 5,
+                 verbose: int = 1,
+                 str_var='%s',
+                 max_pool_size: int = 4,
+                 pool_check_interval: int = 30,
+                 metadata_ttl: float = None,
+                 statement_cache_size: int = 64,
+                 retry_policy: RetryPolicy = None,
+                 circuit_breaker: CircuitBreaker = None):
+
+        # ─── Arguments ───────────────────────────────────────────────────
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = int(port)
+        self.database = database
+        self.table_schema = table_schema
+        self.autocommit = autocommit
+
+        self.max_to_try = max(max_to_try, 1)
+        self.sleep_time = sleep_time
+        # sleep_time is the longest single wait of the default backoff
+        self.retry_policy = retry_policy or RetryPolicy(max_delay=sleep_time)
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+        self.str_var = str_var
+
+        self.max_pool_size = max(int(max_pool_size), 1)
+        self.pool_check_interval = pool_check_interval
+        self.metadata_ttl = metadata_ttl
+        self.statement_cache_size = max(int(statement_cache_size), 1)
+
+        # ─── Declar Variable ─────────────────────────────────────────────
+        self.start_time = None
+        self.conn = None
+
+        self.pool = list()
+        self.pool_lock = threading.Lock()
+        self.pool_slots = threading.BoundedSemaphore(self.max_pool_size)
+        self.local = threading.local()
+        self.metadata_cache = dict()
+        self.metadata_lock = threading.Lock()
+        # sql -> prepared statement name of each open connection, in use order
+        self.prepared = weakref.WeakKeyDictionary()
+        self.prepared_lock = threading.Lock()
+
+        if (logger is not None):
+            self.info = logger.info
+            self.error = logger.error
+            self.debug = logger.debug
+        else:
+            self.info = self.error = self.debug = print
+
+    def __setattr__(self, name: str, value):
+        self.__dict__[name] = value
+
+    def __getattr__(self, name: str):
+        return self.__dict__.get(name, None)
+
+    def __enter__(self):
+        self.start_connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close_connect()
+
+    def sql_prep(self, sql_cmd: str):
+        return prep_sql(sql_cmd, self.str_var)
+
+    @property
+    def pooled(self) -> bool:
+        return getattr(self.local, 'pooled', False)
+
+    @property
+    def active_conn(self):
+        return self.local.conn if self.pooled else self.conn
+
+    @property
+    def connecter(self):
+        if self.pooled:
+            if self.local.conn is None:
+                with stage('connect'):
+                    self.local.conn = self.get_pool_connection()
+            return self.local.conn
+
+        if self.conn is not None:
+            return self.conn
+
+        with stage('connect'):
+            self.conn = self.new_connection()
+        self.start_time = time.time()
+        # connected
+        return self.conn
+
+    def new_connection(self):
+        retry_started = time.monotonic()
+        for try_con in range(1, self.max_to_try + 1):
+            if not self.circuit_breaker.allow():
+                raise CircuitOpenError('Database marked down, not connecting until the circuit breaker resets.')
+            try:
+                conn = dbconnecter.connect(
+                    user=self.username,
+                    password=self.password,
+                    host=self.host,
+                    port=self.port,
+                    database=self.database,
+                )
+                conn.autocommit = self.autocommit
+                self.circuit_breaker.record_success()
+                return conn
+            except (dbconnecter.DatabaseError, dbconnecter.InternalError,
+                    dbconnecter.InterfaceError,
+                    dbconnecter.OperationalError) as e:
+                self.error(f"Error connecting to database : {e}")
+                self.circuit_breaker.record_failure()
+                if not self.retry_wait(try_con, retry_started):
+                    break
+            except BaseException:
+                # anything else must still end a half open trial
+                self.circuit_breaker.record_failure()
+                raise
+
+        raise ConnectionError('Max time try connect exceed.')
+
+    def retry_wait(self, attempt: int, started: float, tries: int = None) -> bool:
+        """
+        Called after failed attempt number `attempt` of a retry loop that began
+        at `started` (time.monotonic): waits the retry policy's backoff and
+        returns True, or returns False without waiting when the attempts or the
+        policy's deadline are used up.
+        """
+        tries = tries or self.max_to_try
+        if attempt >= tries:
+            return False
+
+        delay = self.retry_policy.delay(attempt, started)
+        if delay is None:
+            self.info(f"Retry deadline of {self.retry_policy.deadline} seconds exceeded. [{attempt}/{tries}]")
+            return False
+
+        self.info(f"sleep for {delay:.2f} seconds before trying again. [{attempt}/{tries}]")
+        time.sleep(delay)
+        return True
+
+    def start_connect(self):
+        self.connecter
+
+    def is_healthy(self, conn, idle_since: float) -> bool:
+        """
+        Cheap checks first, only ping connections that sat idle in the pool
+        longer than `pool_check_interval` seconds.
+        """
+        if conn.closed or conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+            return False
+
+        if time.time() - idle_since < self.pool_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('select 1;')
+                cursor.fetchall()
+            return True
+        except dbconnecter.Error:
+            return False
+
+    def get_pool_connection(self):
+        while True:
+            with self.pool_lock:
+                if not self.pool:
+                    break
+                conn, idle_since = self.pool.pop()
+
+            if self.is_healthy(conn, idle_since):
+                return conn
+
+            self.info('Discard unhealthy pooled connection')
+            self.release_pool_connection(conn, close=True)
+
+        return self.new_connection()
+
+    def release_pool_connection(self, conn, close: bool = False):
+        if not close and not conn.closed:
+            status = conn.get_transaction_status()
+            try:
+                if status == TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except dbconnecter.Error:
+                close = True
+
+        if close or conn.closed:
+            try:
+                conn.close()
+            except dbconnecter.Error:
+                pass
+            return
+
+        with self.pool_lock:
+            self.pool.append((conn, time.time()))
+
+    @contextmanager
+    def pooled_connect(self):
+        """
+        Check a connection out of the pool for the current thread, every call
+        made on this instance inside the block runs on it. Blocks while
+        `max_pool_size` connections are already checked out.
+        """
+        if self.pooled:
+            yield self
+            return
+
+        with stage('connect'):
+            self.pool_slots.acquire()
+        self.local.pooled = True
+        self.local.conn = None
+        try:
+            yield self
+        finally:
+            conn = self.local.conn
+            self.local.pooled = False
+            self.local.conn = None
+            if conn is not None:
+                self.release_pool_connection(conn)
+            self.pool_slots.release()
+
+    def close_pool(self):
+        with self.pool_lock:
+            idle, self.pool = self.pool, list()
+
+        for conn, _ in idle:
+            conn.close()
+
+    def close_connect(self):
+        if self.pooled:
+            if self.local.conn is not None:
+                self.release_pool_connection(self.local.conn, close=True)
+                self.local.conn = None
+                self.info("Discard pooled connection to database")
+            return
+
+        if self.conn is not None:
+            self.conn.close()
+            end_time = time.time() - self.start_time
+            self.conn = None
+            self.start_time = None
+            self.info("Close connection to database, time elapsed {}".format(
+                str(timedelta(seconds=end_time))))
+
+    def commit(self):
+        """
+        Commit changes to the current state .
+        """
+        if self.active_conn is not None:
+            self.active_conn.commit()
+
+    def rollback(self):
+        """
+        Roll back the current session .
+        """
+        if self.active_conn is not None:
+            self.info('Rollback')
+            self.active_conn.rollback()
+
+    def ping(self) -> bool:
+        if self.active_conn is not None:
+            try:
+                cursor = self.connecter.cursor()
+                cursor.execute('select 1;')
+                cursor.fetchall()
+                return True
+            except dbconnecter.Error:
+                return False
+        else:
+            self.info(
+                "Ping Fail: Conecter don't exists, please connect before call ping"
+            )
+            return False
+
+    def cast_types(self, data):
+        for i in range(len(data)):
+            for j in range(len(data[i])):
+                data[i][j] = pass_type_value(data[i][j])
+        return data
+
+    def cast_rows(self, data) -> list:
+        """
+        Column-wise cast_types: data is a DataFrame, a 2d array or a list of
+        rows, the result is a list of tuples ready for executemany. Each column's
+        type is looked at once and the whole column is converted in one go.
+        """
+        if isinstance(data, pd.DataFrame):
+            frame = data
+        elif isinstance(data, np.ndarray):
+            frame = pd.DataFrame(data)
+        else:
+            # object keeps python ints with a None in them from turning into floats
+            frame = pd.DataFrame(list(data), dtype=object)
+
+        if frame.shape[1] == 0:
+            return [tuple() for _ in range(len(frame))]
+        return list(zip(*[cast_column(frame.iloc[:, j]) for j in range(frame.shape[1])]))
+
+    # def copy_from_expert(self, df, table, schema, index=False, encoding='UTF-8'):
+    #     for try_con in range(self.max_to_try + 1):
+    #         """
+    #         Here we are going save the dataframe in memory 
+    #         and use copy_from() to copy it to the table
+    #         """
+    #         # save dataframe to an in memory buffer
+    #         cursor = self.connecter.cursor()
+    #         schema_table_name_query = '{}.{}'.format(schema, table)
+    #         column_names_query = f"""SELECT column_name FROM information_schema.columns WHERE table_schema || '.' || table_name = '{schema_table_name_query}' AND column_name NOT ILIKE 'id'"""
+    #         cursor.execute(column_names_query)
+    #         column_names = [row[0].upper() for row in cursor.fetchall()]
+
+    #         buffer = StringIO()
+    #         df.columns = df.columns.str.upper()
+    #         selected_columns = df.loc[:, column_names]
+    #         selected_columns.to_csv(buffer, index=index, header=True, sep=",", encoding=encoding)
+    #         buffer.seek(0)
+    #         # print(selected_columns.columns)
+
+    #         columns_db = ', '.join('"{}"'.format(k) for k in column_names)
+    
+
+    #         schema_table_name = '"{}"."{}"'.format(schema, table)
+    #         # cursor = self.connecter.cursor()
+    #         try:
+    #             cursor.copy_expert(f"copy {schema_table_name} ({columns_db}) from stdin with csv header", buffer)
+    #             # cursor.copy_expert(f"copy {schema_table_name} from stdin with csv header)", buffer)
+    #             # cursor.copy_expert(f"copy {schema_table_name} from stdin WITH CSV HEADER", buffer)
+    #             return "Done execute SQL"
+    #         except dbconnecter.DataError as e:
+    #             raise e
+    #         except (dbconnecter.DatabaseError, dbconnecter.InternalError,
+    #                 dbconnecter.InterfaceError,
+    #                 dbconnecter.OperationalError) as e:
+    #             self.error(f"Error : {e}, Start reconnect")
+    #             self.rollback()
+    #             self.info(
+    #                 f"sleep for {self.sleep_time} seconds before trying again. [{try_con+1}/{self.max_to_try+1}]"
+    #             )
+    #             time.sleep(self.sleep_time)
+    #             self.start_connect()
+
+    
+    def copy_columns(self, table: str, schema: str) -> list:
+        # upper-cased column names copy_from_expert loads into schema.table, the id column left out
+        return [name.upper() for name, _, _ in self.table_metadata(table, schema) if name.lower() != 'id']
+
+    def copy_frame(self,
+                   df,
+                   copy_sql: str,
+                   index: bool = False,
+                   encoding: str = 'UTF-8',
+                   batch_size: int = 100000,
+                   chunk_size: int = 10000) -> int:
+        """
+        COPY a DataFrame batch_size rows per statement. Each batch is rendered
+        to csv chunk_size rows at a time while copy_expert reads it, so only a
+        chunk is ever in memory as text. A batch is one transaction: when it
+        fails it is rolled back and only that batch is retried, the batches
+        before it stay written. Returns the number of rows written.
+        """
+        total = 0
+        for batch in iter_batches(df, batch_size):
+            retry_started = time.monotonic()
+            for try_con in range(1, self.max_to_try + 1):
+                try:
+                    time_start = time.time()
+                    chunks = (chunk.to_csv(index=index, header=False, sep=",").encode(encoding)
+                              for chunk in iter_batches(batch, chunk_size))
+                    with self.connecter.cursor() as cursor:
+                        cursor.copy_expert(copy_sql, IteratorFile(chunks), size=1 << 16)
+                    if not self.active_conn.autocommit:
+                        self.commit()
+                    total += len(batch)
+                    self.info_rate(len(batch), time.time() - time_start)
+                    break
+
+                except dbconnecter.DataError as e:
+                    self.rollback()
+                    raise e
+
+                except dbconnecter.InterfaceError as e:
+                    self.error(f"Error: {e}, Start reconnect")
+                    self.close_connect()
+                    if not self.retry_wait(try_con, retry_started):
+                        raise ConnectionError(f"Failed to copy rows {total}-{total + len(batch)}, {total} rows were written")
+
+                except (dbconnecter.DatabaseError, dbconnecter.InternalError, dbconnecter.OperationalError) as e:
+                    self.error(f"Error: {e}")
+                    self.rollback()
+                    if not self.retry_wait(try_con, retry_started):
+                        raise ConnectionError(f"Failed to copy rows {total}-{total + len(batch)}, {total} rows were written")
+            else:
+                raise ConnectionError(f"Failed to copy rows {total}-{total + len(batch)}, {total} rows were written")
+        return total
+
+    def copy_from_expert(self, df, table, schema, index=False, encoding='UTF-8',
+                         batch_size: int = 100000, chunk_size: int = 10000):
+        column_names = self.copy_columns(table, schema)
+
+        # Reorder DataFrame columns to match the table
+        df = df[column_names]
+
+        columns_db = ', '.join('"{}"'.format(k) for k in column_names)
+        schema_table_name = '"{}"."{}"'.format(schema, table)
+        try:
+            self.copy_frame(df, f"COPY {schema_table_name} ({columns_db}) FROM STDIN WITH CSV",
+                            index=index, encoding=encoding, batch_size=batch_size, chunk_size=chunk_size)
+        except ConnectionError as e:
+            self.error(str(e))
+            return "Failed to execute SQL after max attempts"
+        return "Done execute SQL"
+
+
+    def execute_mogrify(self, table, schemas, cols, value, type_value):
+        """
+        Using cursor.mogrify() to build the bulk insert query
+        then cursor.execute() to execute the query
+        """
+        # Comma-separated dataframe columns
+        # SQL quert to execute
+        cursor = self.connecter.cursor()
+        values = [cursor.mogrify(f"({type_value})", tup).decode('utf8') for tup in value]
+        query  = """INSERT INTO "%s"."%s"(%s) VALUES """ % (schemas, table, cols) + ",".join(values)
+
+        try:
+            time_start = time.time()
+            cursor.execute(query, value)
+            self.info("Done execute SQL code, time elapsed {}".format(
+                str(timedelta(seconds=time.time() - time_start))))
+            return "Done execute SQL"
+        except (dbconnecter.DatabaseError, dbconnecter.InternalError,
+                dbconnecter.InterfaceError,
+                dbconnecter.OperationalError) as error:
+            print("Error: %s" % error)
+            raise error
+        except Exception as e:
+            raise e
+        # raise ConnectionError("Failed to connect database")
+
+    def bulk_insert(self,
+                    table: str,
+                    schemas: str,
+                    cols: str,
+                    value,
+                    type_value: str = None,
+                    batch_size: int = 10000,
+                    page_size: int = 1000,
+                    copy_threshold: int = 50000):
+        """
+        Drop-in for execute_mogrify. value is a list of rows, a DataFrame or a
+        2d array, it is cast and sent batch_size rows at a time so the whole
+        statement is never built in memory. Loads smaller than copy_threshold
+        rows go through execute_values (page_size rows per statement), larger
+        ones through COPY FROM STDIN.
+
+        The load is atomic like the single INSERT of execute_mogrify: on an
+        autocommit connection all statements run in one transaction that is
+        committed at the end, otherwise they join the caller's transaction.
+        """
+        total = len(value)
+        table_name = '"{}"."{}"'.format(schemas, table)
+        batches = (self.cast_rows(batch) for batch in iter_batches(value, batch_size))
+        conn = self.connecter
+        autocommit = conn.autocommit
+        cursor = conn.cursor()
+        try:
+            time_start = time.time()
+            if autocommit:
+                cursor.execute('BEGIN')
+            if total >= copy_threshold:
+                cursor.copy_expert(f"COPY {table_name} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                                   IteratorFile(map(encode_csv, batches)), size=1 << 16)
+            else:
+                template = f"({type_value})" if type_value else None
+                for batch in batches:
+                    execute_values(cursor, f"INSERT INTO {table_name} ({cols}) VALUES %s", batch,
+                                   template=template, page_size=page_size)
+            if autocommit:
+                cursor.execute('COMMIT')
+            self.info_rate(total, time.time() - time_start)
+            return "Done execute SQL"
+        except BaseException as error:
+            # also a failed cast or a cancel, the transaction must not stay open
+            self.error(f"Error : {error}")
+            try:
+                if autocommit:
+                    # the explicit BEGIN is invisible to rollback() on an autocommit connection
+                    cursor.execute('ROLLBACK')
+                else:
+                    self.rollback()
+            except dbconnecter.Error:
+                pass
+            raise
+        finally:
+            cursor.close()
+
+    def bulk_execute(self, sql_cmd: str, data, page_size: int = 1000):
+        """
+        Drop-in for execute(sql_cmd, data) and executeSQL(sql, params, is_many=True):
+        an INSERT ... VALUES (...) is sent page_size rows per statement with
+        execute_values, any other statement page_size rows per round-trip with
+        execute_batch.
+        """
+        sql_exec = self.sql_prep(sql_cmd)
+        rows = self.cast_rows(data)
+        # the VALUES row, one level of nested parentheses like (%s, now()) is allowed
+        match = re.search(r"\bVALUES\s*(\((?:[^()]|\([^()]*\))*\))", sql_exec, re.IGNORECASE)
+        cursor = self.connecter.cursor()
+        try:
+            time_start = time.time()
+            if match:
+                statement = sql_exec[:match.start(1)] + '%s' + sql_exec[match.end(1):]
+                execute_values(cursor, statement, rows, template=match.group(1), page_size=page_size)
+            else:
+                execute_batch(cursor, sql_exec, rows, page_size=page_size)
+            self.info_rate(len(rows), time.time() - time_start)
+            return "Done execute SQL"
+        except (dbconnecter.DatabaseError, dbconnecter.InternalError,
+                dbconnecter.InterfaceError,
+                dbconnecter.OperationalError) as error:
+            self.error(f"Error : {error}")
+            self.rollback()
+            raise error
+        finally:
+            cursor.close()
+
+    def info_rate(self, rows: int, elapsed: float):
+        rate = rows / elapsed if elapsed else float('inf')
+        self.info("Done write {} rows, time elapsed {}, {:.0f} rows/sec".format(
+            rows, str(timedelta(seconds=elapsed)), rate))
+
+
+    def copy_from_stringio(self,
+                           df,
+                           table_name: str,
+                           table_schema: str = None,
+                           batch_size: int = 100000,
+                           chunk_size: int = 10000):
+        """
+        COPY the dataframe into table_name, the columns in the order of the
+        dataframe. Sent through copy_frame, so it is rendered in chunks and a
+        failed batch is retried on its own.
+        """
+        target = f'"{table_schema}"."{table_name}"' if table_schema else f'"{table_name}"'
+
+        time_start = time.time()
+        self.copy_frame(df, f'COPY {target} FROM STDIN WITH CSV',
+                        batch_size=batch_size, chunk_size=chunk_size)
+        self.info("Done execute SQL code, time elapsed {}".format(
+            str(timedelta(seconds=time.time() - time_start))))
+        return 'Done execute SQL code'
+
+    def query_data_to_df(self,
+                         sql_cmd: str,
+                         chunksize: int = None):
+        if chunksize:
+            # like pandas.read_sql, an iterator of DataFrames of `chunksize` rows
+            return self.stream_query(sql_cmd, itersize=chunksize, as_frame='pandas')
+        try:
+            time_start = time.time()
+            cursor = self.connecter.cursor()
+            
+            cursor.execute(sql_cmd)
+            data = cursor.fetchall()
+            cols = []
+            for elt in cursor.description:
+                cols.append(elt[0])
+            df = pd.DataFrame(data=data, columns=cols)
+            return df
+        except (dbconnecter.DatabaseError, dbconnecter.InternalError,
+                dbconnecter.InterfaceError,
+                dbconnecter.OperationalError) as error:
+            print("Error: %s" % error)
+            self.rollback()
+        except Exception as e:
+            raise e
+        raise ConnectionError("Failed to connect database")
+
+    def stream_query(self,
+                     sql_cmd: str,
+                     params=None,
+                     itersize: int = 10000,
+                     as_frame: str = None):
+        """
+        Run the query on a named (server-side) cursor and yield the result in
+        batches of at most `itersize` rows, so only one batch is in memory.
+        Batches are lists of tuples, or DataFrames when `as_frame` is 'pandas'
+        or 'polars'.
+        """
+        conn = self.connecter
+        # without a surrounding transaction the cursor has to be WITH HOLD
+        cursor = conn.cursor(name=f"stream_{uuid4().hex}", withhold=conn.autocommit)
+        cursor.itersize = itersize
+        try:
+            time_start = time.time()
+            with stage('query'):
+                cursor.execute(sql_cmd, params)
+            total = 0
+            while True:
+                with stage('fetch'):
+                    data = cursor.fetchmany(itersize)
+                if not data:
+                    break
+                total += len(data)
+                count('rows', len(data))
+                cols = [elt[0] for elt in cursor.description]
+                yield self.rows_to_frame(data, cols, as_frame)
+
+            self.info("Done stream {} rows, time elapsed {}".format(
+                total, str(timedelta(seconds=time.time() - time_start))))
+        finally:
+            cursor.close()
+
+    @classmethod
+    def rows_to_frame(cls, data: list, cols: list, as_frame: str = None):
+        if as_frame == 'pandas':
+            return pd.DataFrame(data=data, columns=cols)
+        if as_frame == 'polars':
+            import polars as pl
+            return pl.DataFrame(data, schema=cols, orient='row')
+        return data
+
+    # postgres type oid -> how query_to_polars reads the COPY csv column, anything
+    # not listed (text, uuid, json, arrays, ...) stays a string
+    copy_type_map = {
+        16: 'bool',
+        20: 'int', 21: 'int', 23: 'int',
+        700: 'float', 701: 'float', 1700: 'float',
+        1082: 'date',
+        1114: 'timestamp',
+        1184: 'timestamptz',
+    }
+
+    def copy_query(self, sql_cmd: str, params=None, describe: bool = True):
+        """
+        COPY (query) TO STDOUT as csv into an in-memory buffer, returns the
+        buffer and the column description of the query, None without describe.
+        """
+        retry_started = time.monotonic()
+        for try_con in range(1, self.max_to_try + 1):
+            try:
+                time_start = time.time()
+                cursor = self.connecter.cursor()
+                query = cursor.mogrify(sql_cmd, params).decode() if params is not None else sql_cmd
+                query = query.strip().rstrip(';')
+
+                with stage('query'):
+                    # COPY reports no description, an empty select gives the column types
+                    description = None
+                    if describe:
+                        cursor.execute(f"SELECT * FROM ({query}) AS q LIMIT 0")
+                        description = cursor.description
+
+                    buffer = BytesIO()
+                    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER", buffer)
+                cursor.close()
+                buffer.seek(0)
+                self.info("Done copy {} bytes, time elapsed {}".format(
+                    buffer.getbuffer().nbytes, str(timedelta(seconds=time.time() - time_start))))
+                return buffer, description
+            except dbconnecter.InterfaceError as e:
+                self.error(f"Error : {e}, Start reconnect")
+                self.close_connect()
+                if not self.retry_wait(try_con, retry_started):
+                    break
+            except (dbconnecter.DatabaseError, dbconnecter.InternalError,
+                    dbconnecter.OperationalError) as e:
+                self.error(f"Error : {e}")
+                self.rollback()
+                if not self.retry_wait(try_con, retry_started):
+                    break
+        raise ConnectionError("Failed to connect database")
+
+    def query_to_polars(self, sql_cmd: str, params=None, schema: dict = None):
+        """
+        Read a query result straight into a polars DataFrame through COPY, no
+        value is boxed as a python object on the way. Timestamps come back as
+        Datetime('us'), numeric as Float64. A caller that knows the result
+        columns passes schema {column: kind} with the kinds of copy_type_map,
+        which saves the statement that describes the query.
+        """
+        buffer, description = self.copy_query(sql_cmd, params, describe=schema is None)
+        kinds = schema or {col.name: self.copy_type_map.get(col.type_code, 'text') for col in description}
+        with stage('fetch'):
+            df = self.read_copy_csv(buffer, kinds)
+        count('rows', df.height)
+        return df
+
+    def read_copy_csv(self, buffer, kinds):
+        import polars as pl
+        dtypes = {name: pl.Int64 if kind == 'int' else pl.Float64 if kind == 'float' else pl.Utf8
+                  for name, kind in kinds.items()}
+        df = pl.read_csv(buffer, dtypes=dtypes)
+
+        # temporal and bool columns are read as text and parsed with an explicit
+        # format, the csv has a varying number of fraction digits
+        parse = {
+            'bool': lambda col: pl.col(col) == 't',
+            'date': lambda col: pl.col(col).str.to_date('%Y-%m-%d'),
+            'timestamp': lambda col: pl.col(col).str.to_datetime('%Y-%m-%d %H:%M:%S%.f', time_unit='us'),
+            'timestamptz': lambda col: pl.col(col).str.to_datetime('%Y-%m-%d %H:%M:%S%.f%#z', time_unit='us'),
+        }
+        columns = [parse[kind](name) for name, kind in kinds.items() if kind in parse]
+        return df.with_columns(columns) if columns else df
+
+    def execute(self,
+                sql_cmd: str,
+                data: list = None,
+                output_as_list: bool = True):
+        output = list() if output_as_list else None
+        retry_started = time.monotonic()
+        for try_con in range(1, self.max_to_try + 1):
+            try:
+                # PRE PROCESS
+                time_start = time.time()
+                cursor = self.connecter.cursor()
+
+                # EXECUTE PROCESS
+                if isinstance(data, (list, pd.DataFrame, np.ndarray)):
+                    sql_exec = self.sql_prep(sql_cmd)
+                    data = self.cast_rows(data)
+                    cursor.executemany(sql_exec, data)
+                    self.info(f'complete execute sql with {len(data)} rows.')
+                    self.debug(
+                        f"Data size: ({len(data)}), example data: [{data[0] if len(data) > 0 else ''}, sql command: {sql_exec}]"
+                    )
+                else:
+                    with stage('query'):
+                        cursor.execute(sql_cmd)
+                    self.info('complete execute sql.')
+                    try:
+                        with stage('fetch'):
+                            output = cursor.fetchall()
+                        count('rows', len(output))
+                    except dbconnecter.Error:
+                        self.debug("Can't fetch data from cursor")
+
+                # POST PROCESS
+                cursor.close()
+                self.info("Done execute SQL code, time elapsed {}".format(
+                    str(timedelta(seconds=time.time() - time_start))))
+                return output
+
+            except (dbconnecter.InterfaceError) as IE:
+                self.close_connect()
+                if not self.retry_wait(try_con, retry_started):
+                    break
+
+            except (dbconnecter.DatabaseError, dbconnecter.InternalError,
+                    dbconnecter.OperationalError) as e:
+                self.rollback()
+                self.error(f"Error : {e}, Start reconnect")
+                if not self.retry_wait(try_con, retry_started):
+                    break
+            except dbconnecter.DataError as e:
+                raise e
+            except Exception as e:
+                raise e
+        raise ConnectionError("Failed to connect database")
+
+    def executeSQL(self, _exec, _param=[], is_many=False, is_result=True, tries: int = None):
+        # tries caps the attempts, tries=1 runs a statement that must not be repeated once
+        tries = tries or self.max_to_try + 1
+        retry_started = time.monotonic()
+        for try_con in range(tries):
+            try:
+                time_start = time.time()
+                cursor = self.connecter.cursor()
+
+                # convert variable to that mariaDB support
+                _param = self.cast_rows(_param) if is_many else [pass_type_value(value) for value in _param]
+
+                showsql = self.sql_prep(_exec)
+                self.info(f'Start execute SQL code : {showsql}')
+                if (is_many and (len(_param) > 0)):
+                    cursor.executemany(showsql, _param)
+                    output = None
+                else:
+                    with stage('query'):
+                        if (len(_param) > 0):
+                            cursor.execute(showsql, _param)
+                        else:
+                            cursor.execute(showsql)
+                    if is_result:
+                        with stage('fetch'):
+                            output = cursor.fetchall()
+                        count('rows', len(output))
+                    else:
+                        output = None
+                cursor.close()
+                end_time = time.time() - time_start
+                self.info("Done execute SQL code, time elapsed {}".format(
+                    str(timedelta(seconds=end_time))))
+                return output
+            except (dbconnecter.DatabaseError, dbconnecter.InternalError,
+                    dbconnecter.InterfaceError,
+                    dbconnecter.OperationalError) as e:
+                self.error(f"Error : {e}, Start reconnect")
+                self.rollback()
+                if not self.retry_wait(try_con + 1, retry_started, tries):
+                    break
+                self.start_connect()
+            except dbconnecter.DataError as e:
+                raise e
+            except Exception as e:
+                raise e
+        raise ConnectionError("Failed to connect database")
+
+    def prepare(self, sql_cmd: str) -> str:
+        """
+        Name of the server-side prepared statement of `sql_cmd` on the active
+        connection, PREPAREd on its first use there. Past `statement_cache_size`
+        statements the least recently used one is DEALLOCATEd.
+        """
+        conn = self.connecter
+        with self.prepared_lock:
+            statements = self.prepared.setdefault(conn, OrderedDict())
+            name = statements.get(sql_cmd)
+            if name is not None:
+                statements.move_to_end(sql_cmd)
+                return name
+
+            name = statement_name(sql_cmd)
+            with conn.cursor() as cursor:
+                try:
+                    cursor.execute(f'PREPARE {name} AS {numbered_placeholders(self.sql_prep(sql_cmd))}')
+                except dbconnecter.errors.DuplicatePreparedStatement:
+                    # the name is a hash of the sql, the session already has this statement
+                    pass
+                if len(statements) >= self.statement_cache_size:
+                    _, oldest = statements.popitem(last=False)
+                    cursor.execute(f'DEALLOCATE {oldest}')
+            statements[sql_cmd] = name
+            return name
+
+    def forget_prepared(self):
+        with self.prepared_lock:
+            self.prepared.pop(self.active_conn, None)
+
+    def execute_prepared(self, sql_cmd: str, params=None) -> list:
+        """
+        executeSQL(sql_cmd, params) through a prepared statement: the server
+        parses and plans `sql_cmd` once per connection, later calls only bind
+        `params` to its %s placeholders.
+        """
+        params = [cast_value(value) for value in params or []]
+        retry_started = time.monotonic()
+        for try_con in range(1, self.max_to_try + 1):
+            try:
+                time_start = time.time()
+                name = self.prepare(sql_cmd)
+                cursor = self.connecter.cursor()
+                with stage('query'):
+                    if params:
+                        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+                    else:
+                        cursor.execute(f'EXECUTE {name}')
+                with stage('fetch'):
+                    output = cursor.fetchall()
+                count('rows', len(output))
+                cursor.close()
+                self.info("Done execute prepared {}, time elapsed {}".format(
+                    name, str(timedelta(seconds=time.time() - time_start))))
+                return output
+
+            except dbconnecter.errors.InvalidSqlStatementName:
+                # the session dropped its statements (DISCARD ALL), prepare them again
+                self.rollback()
+                self.forget_prepared()
+                if try_con >= self.max_to_try:
+                    break
+            except dbconnecter.DataError:
+                # a bad parameter fails the same way on every attempt
+                self.rollback()
+                raise
+            except (dbconnecter.InterfaceError):
+                self.close_connect()
+                if not self.retry_wait(try_con, retry_started):
+                    break
+            except (dbconnecter.DatabaseError, dbconnecter.InternalError,
+                    dbconnecter.OperationalError) as e:
+                self.rollback()
+                self.error(f"Error : {e}, Start reconnect")
+                if not self.retry_wait(try_con, retry_started):
+                    break
+        raise ConnectionError("Failed to connect database")
+
+    def query_columns_name_by_table(self,
+                                    table_name: str,
+                                    table_schema: str = None,
+                                    table_catalog: str = None):
+        # table_catalog is kept for the callers, information_schema only shows the current database
+        if table_schema is None and '.' in table_name:
+            table_schema, table_name = table_name.split('.', 1)
+
+        if table_schema is None:
+            table_schema = self.table_schema
+
+        return [name for name, _, _ in self.table_metadata(table_name, table_schema)]
+
+    def query_metadata(self, table_schema: str, table_name: str = None) -> dict:
+        sql_col = """SELECT table_name, column_name, data_type, ordinal_position
+                     FROM information_schema.columns
+                     WHERE table_schema = %s"""
+        params = [table_schema]
+        if table_name is not None:
+            sql_col += " AND table_name = %s"
+            params.append(table_name)
+
+        metadata = dict()
+        for table, column, data_type, position in self.executeSQL(sql_col + " ORDER BY table_name, ordinal_position", params):
+            metadata.setdefault((table_schema, table), []).append((column, data_type, position))
+        return metadata
+
+    def table_metadata(self, table_name: str, table_schema: str = None) -> list:
+        """
+        [(column_name, data_type, ordinal_position), ...] of a table in ordinal
+        order, from the metadata cache. A miss, or an entry older than
+        metadata_ttl seconds, is read from information_schema. Tables that do
+        not exist are not cached.
+        """
+        key = (table_schema or self.table_schema, table_name)
+        with self.metadata_lock:
+            entry = self.metadata_cache.get(key)
+        if entry is not None and (self.metadata_ttl is None or time.time() - entry[0] < self.metadata_ttl):
+            return entry[1]
+
+        columns = self.query_metadata(*key).get(key, [])
+        if columns:
+            with self.metadata_lock:
+                self.metadata_cache[key] = (time.time(), columns)
+        return columns
+
+    def warm_metadata(self, table_schema: str = None) -> int:
+        # load every table of the schema with one catalog query, returns the number of tables
+        metadata = self.query_metadata(table_schema or self.table_schema)
+        loaded_at = time.time()
+        with self.metadata_lock:
+            for key, columns in metadata.items():
+                self.metadata_cache[key] = (loaded_at, columns)
+        return len(metadata)
+
+    def invalidate_metadata(self, table_name: str = None, table_schema: str = None):
+        """
+        Drop cached metadata: one table, every table of table_schema when
+        table_name is None, or everything when both are None.
+        """
+        with self.metadata_lock:
+            if table_name is None and table_schema is None:
+                self.metadata_cache.clear()
+            elif table_name is None:
+                for key in [key for key in self.metadata_cache if key[0] == table_schema]:
+                    del self.metadata_cache[key]
+            else:
+                self.metadata_cache.pop((table_schema or self.table_schema, table_name), None)
+
+    @classmethod
+    def extract_columns_name_from_sql(cls, sql: str):
+        str_ = re.search(r"(?<=SELECT).*?(?=FROM)", sql, re.IGNORECASE)
+        if str_:
+            str_ = str_.group(0)
+            cols = str_.split(',')
+            cols = list(map(str.strip, cols))
+            return cols
+        return []
+
+    @classmethod
+    def extract_table_name_from_sql(cls, sql: str):
+        out = re.search(r"(?<=(FROM|INTO))(.*=?)", sql,
+                        re.IGNORECASE).group(0).strip().split()[0]
+        out = re.sub('["\']', '', out)
+        return out
+
+    def query_dataframe_by_sql(self,
+                               sql: str,
+                               with_column: bool = True,
+                               as_polars: bool = False) -> pd.DataFrame:
+        if as_polars:
+            # COPY keeps the real column names, with_column has nothing to look up
+            return self.query_to_polars(sql)
+        cols = self.extract_columns_name_from_sql(sql)
+        if '*' in cols and with_column:
+            table = self.extract_table_name_from_sql(sql)
+            cols = self.query_columns_name_by_table(table)
+        cols = [re.sub('["*`]', '', col) for col in cols]
+        curs = self.execute(sql)
+        dfx = pd.DataFrame(curs,
+                           columns=cols) if with_column else pd.DataFrame(curs)
+        return dfx
+
+    def lazy_query(self, table_name: str, table_schema: str = None) -> LazyQuery:
+        """
+        A LazyQuery over a table, its filters, projection and aggregations run
+        in the database when it is collected. The columns come from the
+        metadata cache, a table that does not exist raises ValueError.
+        """
+        table_schema = table_schema or self.table_schema
+        columns = [column for column, _, _ in self.table_metadata(table_name, table_schema)]
+        if not columns:
+            raise ValueError(f'table {table_schema}.{table_name} not found')
+        source = f'{quote_identifier(table_schema)}.{quote_identifier(table_name)}'
+        return LazyQuery(self, source, columns=columns)
+
+    def lazy_sql(self, sql_cmd: str, params=None) -> LazyQuery:
+        # a LazyQuery over the result of sql_cmd, its columns are not checked
+        return LazyQuery(self, f'({sql_cmd.strip().rstrip(";")}) AS q', params)
+
+
+@lru_cache(maxsize=1024)
+def prep_sql(sql_cmd: str, str_var: str) -> str:
+    # DatabaseUtil.sql_prep runs on every execute, the repository sends the same few statements
+    sql_out = re.sub(r"['\"]{2,}", '', sql_cmd)
+    sql_out = re.sub(r"\s+", ' ', sql_out)
+    sql_out = re.sub(r"(%s)|[?]", str_var, sql_out)
+    return sql_out
+
+
+@lru_cache(maxsize=1024)
+def numbered_placeholders(sql_cmd: str) -> str:
+    # PREPARE and asyncpg take $1, $2, ... where psycopg2 takes %s
+    counter = iter(range(1, sql_cmd.count('%s') + 1))
+    return re.sub(r'%s', lambda _: f'${next(counter)}', sql_cmd)
+
+
+def statement_name(sql_cmd: str) -> str:
+    return 'stmt_' + hashlib.md5(sql_cmd.encode()).hexdigest()[:16]
+
+
+def iter_batches(data, batch_size: int):
+    # consecutive row slices of a list, DataFrame or 2d array
+    rows = data.iloc if isinstance(data, pd.DataFrame) else data
+    for offset in range(0, len(data), batch_size):
+        yield rows[offset:offset + batch_size]
+
+
+def array_literal(values) -> str:
+    # a PostgreSQL array literal, '{"a","b"}', nested lists become nested arrays
+    items = []
+    for value in values:
+        if value is None:
+            items.append('NULL')
+        elif isinstance(value, (list, tuple)):
+            items.append(array_literal(value))
+        else:
+            items.append('"' + str(csv_value(value)).replace('\\', '\\\\').replace('"', '\\"') + '"')
+    return '{' + ','.join(items) + '}'
+
+
+def csv_value(value):
+    # the text COPY reads for the values psycopg2 would adapt to bytea, arrays and json
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return '\\x' + bytes(value).hex()
+    if isinstance(value, (list, tuple)):
+        return array_literal(value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+
+def encode_csv(rows) -> bytes:
+    # None goes out as an unquoted \N, the NULL marker of the COPY in bulk_insert,
+    # so NULL and '' stay apart (a string that is exactly \N would load as NULL)
+    buffer = StringIO()
+    csv.writer(buffer).writerows([['\\N' if value is None else csv_value(value) for value in row] for row in rows])
+    return buffer.getvalue().encode('utf8')
+
+
+class IteratorFile:
+    """
+    Read-only file object over an iterator of bytes chunks, lets copy_expert
+    pull a COPY FROM STDIN body that is produced while it is being sent.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.chunk = b''
+        self.position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        out = []
+        while size != 0:
+            if self.position >= len(self.chunk):
+                self.chunk, self.position = next(self.chunks, None), 0
+                if self.chunk is None:
+                    self.chunk = b''
+                    break
+                continue
+            end = len(self.chunk) if size < 0 else self.position + size
+            piece = self.chunk[self.position:end]
+            self.position += len(piece)
+            size = size - len(piece) if size > 0 else size
+            out.append(piece)
+        return b''.join(out)
+
+
+# values psycopg2 adapts as they are, cast_column only has to fix up nulls and "-"
+native_types = (str, int, float, bool, decimal.Decimal, bytes, list, dict, type(None),
+                datetime.datetime, datetime.date, datetime.time, datetime.timedelta)
+
+
+def cast_value(value):
+    # pass_type_value for one value, bools stay bools for a boolean column and arrays go as they are
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (list, tuple)):
+        return value
+    return pass_type_value(value)
+
+
+def cast_column(column: pd.Series):
+    """
+    pass_type_value over a whole column, returns an array or list of python
+    values. Typed columns are converted by dtype, object columns of plain
+    python values only get their nulls and "-" replaced, anything else (numpy
+    scalars, Timestamps) goes through pass_type_value cell by cell. Bools stay
+    python bools, PostgreSQL does not take an integer for a boolean column.
+    """
+    values = column.to_numpy()
+    if values.dtype.kind == 'M':
+        # microseconds is all a python datetime holds, NaT comes out as None
+        return values.astype('datetime64[us]').astype(object)
+    if values.dtype.kind in 'iu':
+        return values.tolist()
+    if values.dtype.kind == 'b':
+        return values.tolist()
+    if values.dtype.kind == 'f':
+        out = values.astype(object)
+        out[np.isnan(values)] = None
+        return out
+
+    # also turns the pd.NA of the nullable extension dtypes into None
+    values = column.to_numpy(dtype=object, na_value=None)
+    types = set(map(type, values))
+    if not types.issubset(native_types):
+        return [cast_value(value) for value in values]
+
+    if str in types:
+        values[values == "-"] = 0
+    return values
+
+
+def pass_type_value(data):
+    val = data
+    val = 0 if val == "-" else val
+    val = int(val) if isinstance(val, (int, np.integer, np.int64)) else val
+    val = float(val) if isinstance(val,
+                                   (float, np.floating, np.float64)) else val
+    val = pd.to_datetime(val).to_pydatetime() if isinstance(
+        val, (np.datetime64, pd.Timestamp)) else val
+    val = None if pd.isnull(val) else val
+    return val
\ No newline at end of file
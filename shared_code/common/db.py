@@ -0,0 +1,23 @@
+from .database_Util import DatabaseUtil
+from .async_database_Util import AsyncDatabaseUtil
+import os
+from dotenv import load_dotenv
+
+
+load_dotenv()
+connection = DatabaseUtil(username=os.getenv('DB_USER'),
+                        password=os.getenv('DB_PASSWORD'),
+                        host=os.getenv('DB_HOST'),
+                        database=os.getenv('DB_NAME'),
+                        port=os.getenv('DB_PORT', 5432),
+                        table_schema="DBO",
+                        max_pool_size=os.getenv('DB_POOL_SIZE', 4))
+# same database for the async report path, a connect failure on either side opens the shared breaker
+async_connection = AsyncDatabaseUtil(username=os.getenv('DB_USER'),
+                        password=os.getenv('DB_PASSWORD'),
+                        host=os.getenv('DB_HOST'),
+                        database=os.getenv('DB_NAME'),
+                        port=os.getenv('DB_PORT', 5432),
+                        table_schema="DBO",
+                        max_pool_size=os.getenv('DB_POOL_SIZE', 4),
+                        circuit_breaker=connection.circuit_breaker)
@@ -0,0 +1,195 @@
+import copy
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class LazyQuery:
+    '''
+    A read of one table or query that is built up like a polars LazyFrame and
+    runs as a single SQL statement. filter, select, unique, group_by/agg, sort
+    and limit only change the SQL. collect() fetches the result through COPY
+    and lazy() hands it on as a polars LazyFrame, so only the rows and columns
+    that survive the pushed down steps leave the database.
+
+        (connection.lazy_query('PRICE', 'DBO')
+            .filter('SETTLEMENTDATE', 'between', (start, end))
+            .group_by('REGIONID')
+            .agg(first=('min', 'SETTLEMENTDATE'), rows=('count', '*'))
+            .lazy())
+
+    Steps apply in the order they are called, a step that can not be merged
+    into the statement so far (a filter after an aggregation or a limit, ...)
+    wraps it in a subquery. Values are always bound parameters, column names
+    are checked against the columns of the step before when they are known.
+    '''
+
+    operators = ('=', '!=', '<', '<=', '>', '>=', 'between', 'in', 'not in', 'like', 'is null', 'is not null')
+    aggregates = ('count', 'count_distinct', 'min', 'max', 'sum', 'avg')
+
+    def __init__(self, database, source: str, params=None, columns: list = None, depth: int = 0):
+        self.database = database
+        # a quoted table name or a parenthesized subquery with its alias
+        self.source = source
+        self.params = list(params or [])
+        self.columns = columns
+        self.depth = depth
+
+        self.conditions = []
+        self.condition_params = []
+        self.projection = None
+        self.distinct = False
+        self.keys = None
+        self.aggregations = None
+        self.order = []
+        self.row_limit = None
+
+    @property
+    def output_columns(self):
+        # the columns of the result, None when the source is a query and nothing was selected
+        if self.aggregations is not None:
+            return list(self.keys or []) + list(self.aggregations)
+        if self.projection is not None:
+            return list(self.projection)
+        return self.columns
+
+    def check_columns(self, columns):
+        known = self.output_columns
+        unknown = [column for column in columns if known is not None and column not in known]
+        if unknown:
+            raise ValueError(f"unknown columns {', '.join(unknown)}, expected some of {', '.join(known)}")
+
+    def replace(self, **changes):
+        query = copy.copy(self)
+        query.conditions = list(self.conditions)
+        query.condition_params = list(self.condition_params)
+        query.order = list(self.order)
+        query.__dict__.update(changes)
+        return query
+
+    def nest(self):
+        '''
+        The statement so far as the source of the next one. A subquery does not
+        keep its row order, so the sort moves out when its columns are still
+        there, the inner statement only keeps it for its LIMIT.
+        '''
+        columns = self.output_columns
+        inner = self if self.row_limit is not None else self.replace(order=[])
+        sql, params = inner.sql()
+        query = LazyQuery(self.database, f'({sql}) AS q{self.depth}', params, columns, self.depth + 1)
+        if columns is None or all(column in columns for column, _ in self.order):
+            query.order = list(self.order)
+        return query
+
+    def filter(self, column: str, operator: str, value=None):
+        '''
+        Keep the rows where `column operator value`. between takes a (low, high)
+        pair, in and not in a sequence, is null and is not null no value.
+        '''
+        operator = operator.lower()
+        if operator not in self.operators:
+            raise ValueError(f"unknown operator {operator}, expected one of {', '.join(self.operators)}")
+        query = self.nest() if self.aggregations is not None or self.row_limit is not None else self
+        query.check_columns([column])
+
+        name = quote_identifier(column)
+        if operator == 'between':
+            condition, params = f'{name} BETWEEN %s AND %s', list(value)
+        elif operator in ('in', 'not in'):
+            values = tuple(value)
+            if not values:
+                # IN () is not valid SQL, an empty list matches nothing
+                condition, params = ('FALSE' if operator == 'in' else 'TRUE'), []
+            else:
+                condition, params = f'{name} {operator.upper()} %s', [values]
+        elif operator in ('is null', 'is not null'):
+            condition, params = f'{name} {operator.upper()}', []
+        else:
+            condition, params = f'{name} {operator.upper()} %s', [value]
+        return query.replace(conditions=query.conditions + [condition],
+                             condition_params=query.condition_params + params)
+
+    def select(self, *columns: str):
+        query = self.nest() if self.aggregations is not None or self.distinct else self
+        query.check_columns(columns)
+        return query.replace(projection=list(columns))
+
+    def unique(self):
+        # SELECT DISTINCT over the columns selected so far, like an aggregation it keeps no row order
+        query = self.nest() if self.aggregations is not None or self.row_limit is not None else self
+        return query.replace(distinct=True, order=[])
+
+    def group_by(self, *keys: str):
+        query = self.nest() if self.aggregations is not None or self.row_limit is not None or self.distinct else self
+        query.check_columns(keys)
+        return query.replace(keys=list(keys))
+
+    def agg(self, **aggregations):
+        '''
+        name=(function, column) per output column, function is one of
+        count, count_distinct, min, max, sum, avg. count takes '*' as column.
+        Without group_by the whole input is one group.
+        '''
+        if self.aggregations is not None or (self.keys is None and (self.row_limit is not None or self.distinct)):
+            return self.nest().agg(**aggregations)
+        for name, (function, column) in aggregations.items():
+            if function not in self.aggregates:
+                raise ValueError(f"unknown aggregate {function} for {name}, expected one of {', '.join(self.aggregates)}")
+            if not (function == 'count' and column == '*'):
+                self.check_columns([column])
+        # rows of a group have no order to keep
+        return self.replace(aggregations=dict(aggregations), order=[])
+
+    def sort(self, *columns: str, descending: bool = False):
+        query = self.nest() if self.row_limit is not None else self
+        query.check_columns(columns)
+        return query.replace(order=query.order + [(column, descending) for column in columns])
+
+    def limit(self, rows: int):
+        limit = int(rows) if self.row_limit is None else min(self.row_limit, int(rows))
+        return self.replace(row_limit=limit)
+
+    def aggregate_sql(self, name, function, column):
+        if function == 'count' and column == '*':
+            expression = 'count(*)'
+        elif function == 'count_distinct':
+            expression = f'count(DISTINCT {quote_identifier(column)})'
+        else:
+            expression = f'{function}({quote_identifier(column)})'
+        return f'{expression} AS {quote_identifier(name)}'
+
+    def sql(self):
+        # (statement, params) with %s placeholders, as query_to_polars takes them
+        if self.keys is not None and self.aggregations is None:
+            raise ValueError('group_by needs an agg')
+        if self.aggregations is not None:
+            select = [quote_identifier(key) for key in self.keys or []]
+            select += [self.aggregate_sql(name, function, column)
+                       for name, (function, column) in self.aggregations.items()]
+        elif self.projection is not None:
+            select = [quote_identifier(column) for column in self.projection]
+        else:
+            select = ['*']
+
+        sql = 'SELECT ' + ('DISTINCT ' if self.distinct else '') + ', '.join(select) + f' FROM {self.source}'
+        params = self.params + self.condition_params
+        if self.conditions:
+            sql += ' WHERE ' + ' AND '.join(self.conditions)
+        if self.aggregations is not None and self.keys:
+            sql += ' GROUP BY ' + ', '.join(quote_identifier(key) for key in self.keys)
+        if self.order:
+            sql += ' ORDER BY ' + ', '.join(quote_identifier(column) + (' DESC' if descending else '')
+                                            for column, descending in self.order)
+        if self.row_limit is not None:
+            sql += ' LIMIT %s'
+            params.append(self.row_limit)
+        return sql, params
+
+    def collect(self):
+        # the polars DataFrame of the statement, read through COPY
+        sql, params = self.sql()
+        return self.database.query_to_polars(sql, params or None)
+
+    def lazy(self):
+        return self.collect().lazy()
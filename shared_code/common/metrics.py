@@ -0,0 +1,130 @@
+'''
+Per request stage timings for the gap report. Nothing is recorded unless a
+request opened a collector with collect(), stage() and count() are then a
+ContextVar lookup. Inside table_scope(table_name) they add to that table's
+record, outside of one to the request's own record.
+
+    connect_s    waiting for and opening a database connection
+    query_s      running the statement, for COPY also the transfer
+    fetch_s      turning the result into rows or a frame
+    grid_s       building the expected slot grid
+    diff_s       finding the missing slots in the grid
+    serialize_s  formatting and encoding the report
+    rows         rows the database returned
+    gaps         missing slots found
+    bytes        characters of the response body
+
+Threads started with a copy of the caller's context (asyncio.to_thread, asyncio
+tasks, run_in_context) report into the same collector.
+'''
+import contextvars
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+request_timings = contextvars.ContextVar('request_timings', default=None)
+table_timings = contextvars.ContextVar('table_timings', default=None)
+
+# share of log_payload calls written while DEBUG is enabled
+payload_sample_rate = float(os.getenv('PAYLOAD_LOG_SAMPLE', '1'))
+
+
+def current_record():
+    record = table_timings.get()
+    if record is None:
+        timings = request_timings.get()
+        record = None if timings is None else timings['request']
+    return record
+
+
+@contextmanager
+def collect():
+    '''
+    Collect the timings of everything run inside the block, yields the
+    collector, as_dict(collector) is what goes into the response.
+    '''
+    timings = {'started': time.perf_counter(), 'request': dict(), 'tables': dict()}
+    token = request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        request_timings.reset(token)
+
+
+@contextmanager
+def table_scope(table_name):
+    # table_name None keeps recording into the request
+    timings = request_timings.get()
+    if timings is None or table_name is None:
+        yield
+        return
+
+    token = table_timings.set(timings['tables'].setdefault(table_name, dict()))
+    try:
+        yield
+    finally:
+        table_timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    record = current_record()
+    if record is None:
+        yield
+        return
+
+    time_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        key = f'{name}_s'
+        record[key] = record.get(key, 0) + time.perf_counter() - time_start
+
+
+def count(name, value):
+    record = current_record()
+    if record is not None:
+        record[name] = record.get(name, 0) + value
+
+
+def timed_chunks(chunks, table_name=None, name='serialize'):
+    # stage() for a generator: only the time spent producing each chunk counts
+    chunks = iter(chunks)
+    while True:
+        with table_scope(table_name), stage(name):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def run_in_context(func):
+    # for executor.map, which does not carry the caller's context into its threads
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+def as_dict(timings) -> dict:
+    def rounded(record):
+        return {key: round(value, 6) if isinstance(value, float) else value for key, value in record.items()}
+
+    return {
+        'total_s': round(time.perf_counter() - timings['started'], 6),
+        **rounded(timings['request']),
+        'tables': {table_name: rounded(record) for table_name, record in timings['tables'].items()},
+    }
+
+
+def log_payload(message, payload):
+    '''
+    logger.debug(message, payload) for a sample of the calls, neither the
+    payload nor the message is formatted when DEBUG is off or the call is not
+    sampled.
+    '''
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < payload_sample_rate:
+        logger.debug(message, payload)
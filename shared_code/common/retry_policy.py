@@ -0,0 +1,94 @@
+import asyncio
+import random
+import threading
+import time
+
+
+class CircuitOpenError(ConnectionError):
+    pass
+
+
+class RetryPolicy:
+    '''
+    Backoff between the attempts of a DatabaseUtil retry loop: the n-th wait is
+    base_delay * 2 ** (n - 1) capped at max_delay, drawn uniformly from
+    [0, that] when jitter is on so failing workers do not retry in lockstep.
+    No wait goes past `deadline` seconds after the first attempt started.
+    '''
+
+    def __init__(self,
+                 base_delay: float = 0.2,
+                 max_delay: float = 5.0,
+                 deadline: float = 10.0,
+                 jitter: bool = True):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.jitter = jitter
+
+    def delay(self, attempt: int, started: float):
+        # seconds to wait after the failed `attempt`, None when the deadline is used up
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        if self.deadline is not None:
+            remaining = started + self.deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            delay = min(delay, remaining)
+        return delay
+
+    async def sleep_async(self, attempt: int, started: float) -> bool:
+        # waits delay() without blocking the event loop, False when the deadline is used up
+        delay = self.delay(attempt, started)
+        if delay is None:
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+
+class CircuitBreaker:
+    '''
+    Fails fast while the database is known to be down. After failure_threshold
+    consecutive failed connects the circuit opens and allow() refuses every
+    connect for reset_timeout seconds, then a single trial connect is let
+    through (half open): success closes the circuit, failure opens it again.
+    '''
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self.trial else 'open'
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self.trial = False
@@ -0,0 +1,60 @@
+from ..common.db import connection
+from ..common.database_Util import array_literal
+
+
+coverage_table = '"DBO"."COVERAGE_INDEX"'
+
+created = False
+
+
+def create_coverage_index():
+    '''
+    One row per table and frequency: every grid slot between EXTENT_START and
+    EXTENT_END is confirmed present, except the runs listed in GAP_STARTS/GAP_ENDS.
+    '''
+    global created
+    if created:
+        return
+    query = f'''
+        CREATE TABLE IF NOT EXISTS {coverage_table} (
+            "TABLE_NAME" text NOT NULL,
+            "FREQUENCY" text NOT NULL,
+            "EXTENT_START" timestamp NOT NULL,
+            "EXTENT_END" timestamp NOT NULL,
+            "GAP_STARTS" timestamp[] NOT NULL,
+            "GAP_ENDS" timestamp[] NOT NULL,
+            "UPDATED_AT" timestamp NOT NULL DEFAULT now(),
+            PRIMARY KEY ("TABLE_NAME", "FREQUENCY")
+        )
+    '''
+    connection.executeSQL(query, is_result=False)
+    created = True
+
+
+def query_coverage(table_name, frequency):
+    create_coverage_index()
+    query = f'''
+        SELECT "EXTENT_START", "EXTENT_END", "GAP_STARTS", "GAP_ENDS"
+        FROM {coverage_table}
+        WHERE "TABLE_NAME" = %s AND "FREQUENCY" = %s
+    '''
+    result = connection.executeSQL(query, [table_name, frequency])
+    return result[0] if result else None
+
+
+def upsert_coverage(table_name, frequency, extent_start, extent_end, gap_starts, gap_ends):
+    create_coverage_index()
+    query = f'''
+        INSERT INTO {coverage_table}
+            ("TABLE_NAME", "FREQUENCY", "EXTENT_START", "EXTENT_END", "GAP_STARTS", "GAP_ENDS", "UPDATED_AT")
+        VALUES (%s, %s, %s, %s, %s::timestamp[], %s::timestamp[], now())
+        ON CONFLICT ("TABLE_NAME", "FREQUENCY") DO UPDATE SET
+            "EXTENT_START" = EXCLUDED."EXTENT_START",
+            "EXTENT_END" = EXCLUDED."EXTENT_END",
+            "GAP_STARTS" = EXCLUDED."GAP_STARTS",
+            "GAP_ENDS" = EXCLUDED."GAP_ENDS",
+            "UPDATED_AT" = EXCLUDED."UPDATED_AT"
+    '''
+    # executeSQL casts every parameter as a scalar, so the arrays go over as text
+    params = [table_name, frequency, extent_start, extent_end, array_literal(gap_starts), array_literal(gap_ends)]
+    connection.executeSQL(query, params, is_result=False)
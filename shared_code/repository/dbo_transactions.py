@@ -0,0 +1,150 @@
+import polars as pl
+from ..common.db import connection, async_connection
+
+
+frequency_interval_map = {
+    '5min': '5 minutes',
+    '30min': '30 minutes',
+    'H': '1 hour',
+}
+
+
+def bucket_expression(column, frequency):
+    # 30min rows are rounded down to the half hour, the other frequencies match exactly
+    if frequency == '30min':
+        return f'date_bin(\'30 minutes\', "{column}", TIMESTAMP \'2000-01-01\')'
+    return f'"{column}"'
+
+
+def timestamp_query(column, table_name):
+    return f'SELECT DISTINCT "{column}" FROM "DBO"."{table_name}" WHERE "{column}" BETWEEN %s AND %s'
+
+
+def query_timestamp(column, table_name, start_timestamp, end_timestamp, as_frame=False):
+    if as_frame:
+        # columnar path, the timestamps are parsed by polars instead of psycopg2
+        return connection.query_to_polars(timestamp_query(column, table_name), (start_timestamp, end_timestamp),
+                                          schema={column: 'timestamp'})
+
+    # prepared once per connection and table, the window is bound
+    result = connection.execute_prepared(timestamp_query(column, table_name), (start_timestamp, end_timestamp))
+    return result
+
+
+def stream_timestamp(column, table_name, start_timestamp, end_timestamp, itersize=50000):
+    # query_timestamp through a server-side cursor, yields batches of rows
+    return connection.stream_query(timestamp_query(column, table_name), (start_timestamp, end_timestamp), itersize=itersize)
+
+
+def missing_timestamp_query(column, table_name, frequency):
+    '''
+    Build the expected grid with generate_series and anti-join it against the
+    bucketed column, so only the missing slots leave the database. Takes
+    (start, end, start, end) as parameters.
+    '''
+    return f'''
+        WITH present AS (
+            SELECT DISTINCT {bucket_expression(column, frequency)} AS slot
+            FROM "DBO"."{table_name}"
+            WHERE "{column}" BETWEEN %s AND %s
+        )
+        SELECT grid.slot
+        FROM generate_series(%s::timestamp, %s::timestamp, interval '{frequency_interval_map[frequency]}') AS grid(slot)
+        LEFT JOIN present ON present.slot = grid.slot
+        WHERE present.slot IS NULL
+        ORDER BY grid.slot
+    '''
+
+
+def query_missing_timestamp(column, table_name, frequency, start_timestamp, end_timestamp):
+    params = [start_timestamp, end_timestamp, start_timestamp, end_timestamp]
+    result = connection.execute_prepared(missing_timestamp_query(column, table_name, frequency), params)
+    return result
+
+
+async def query_missing_timestamp_async(column, table_name, frequency, start, end):
+    # asyncpg binds timestamps as datetimes, start and end are parsed already
+    return await async_connection.fetch(missing_timestamp_query(column, table_name, frequency), (start, end, start, end))
+
+
+def query_missing_timestamps_batch(scans):
+    '''
+    query_missing_timestamp for several tables in one statement, a UNION ALL of
+    the per table anti-joins. scans is a list of
+    (table_name, column, frequency, start_timestamp, end_timestamp), the result
+    is a polars frame of (scan, slot) where scan is the index into scans.
+    '''
+    selects, params = [], []
+    for scan, (table_name, column, frequency, start_timestamp, end_timestamp) in enumerate(scans):
+        selects.append(f'''
+            SELECT {scan} AS scan, grid.slot
+            FROM generate_series(%s::timestamp, %s::timestamp, %s::interval) AS grid(slot)
+            LEFT JOIN (
+                SELECT DISTINCT {bucket_expression(column, frequency)} AS slot
+                FROM "DBO"."{table_name}"
+                WHERE "{column}" BETWEEN %s AND %s
+            ) AS present ON present.slot = grid.slot
+            WHERE present.slot IS NULL
+        ''')
+        params += [start_timestamp, end_timestamp, frequency_interval_map[frequency], start_timestamp, end_timestamp]
+    query = ' UNION ALL '.join(selects) + ' ORDER BY scan, slot'
+    # a single statement, query_to_polars would first describe the query and then COPY it
+    result = connection.executeSQL(query, params)
+    return pl.DataFrame(result, schema=[('scan', pl.Int64), ('slot', pl.Datetime('us'))], orient='row')
+
+
+def query_key_timestamps(column, key, table_name, start_timestamp, end_timestamp):
+    # query_timestamp per key, a polars frame of (key, timestamp)
+    query = f'SELECT DISTINCT "{key}", "{column}" FROM "DBO"."{table_name}" WHERE "{column}" BETWEEN %s AND %s'
+    return connection.query_to_polars(query, (start_timestamp, end_timestamp), schema={key: 'text', column: 'timestamp'})
+
+
+def query_keys(column, key, table_name, start, end):
+    # the distinct keys with a row between start and end, sorted
+    query = f'SELECT DISTINCT "{key}"::text FROM "DBO"."{table_name}" WHERE "{column}" BETWEEN %s AND %s ORDER BY 1'
+    return [row[0] for row in connection.execute_prepared(query, (start, end))]
+
+
+def query_missing_key_timestamps(column, key, table_name, frequency, start_timestamp, end_timestamp, keys):
+    '''
+    query_missing_timestamp per key: the grid is crossed with the keys and
+    anti-joined against the bucketed (key, slot) pairs read by one range scan
+    of the timestamp column. The result is a polars frame of (key, slot)
+    ordered by key and slot.
+    '''
+    query = f'''
+        WITH present AS (
+            SELECT DISTINCT "{key}"::text AS key, {bucket_expression(column, frequency)} AS slot
+            FROM "DBO"."{table_name}"
+            WHERE "{column}" BETWEEN %s AND %s
+        ), keys AS (
+            SELECT unnest(%s::text[]) AS key
+        )
+        SELECT keys.key, grid.slot
+        FROM keys
+        CROSS JOIN generate_series(%s::timestamp, %s::timestamp, interval '{frequency_interval_map[frequency]}') AS grid(slot)
+        LEFT JOIN present ON present.key = keys.key AND present.slot = grid.slot
+        WHERE present.slot IS NULL
+        ORDER BY keys.key, grid.slot
+    '''
+    params = [start_timestamp, end_timestamp, list(keys), start_timestamp, end_timestamp]
+    result = connection.query_to_polars(query, params, schema={'key': 'text', 'slot': 'timestamp'})
+    return result
+
+
+def query_timestamp_ranges(column, table_name, ranges):
+    '''
+    Same as query_timestamp over several disjoint [start, end] ranges in one round-trip.
+    The ranges are bound as two arrays, so the statement text and its prepared
+    statement stay the same whatever the number of ranges.
+    '''
+    if not ranges:
+        return []
+    query = f'''
+        SELECT DISTINCT t."{column}"
+        FROM unnest(%s::timestamp[], %s::timestamp[]) AS r(low, high)
+        JOIN "DBO"."{table_name}" AS t ON t."{column}" BETWEEN r.low AND r.high
+    '''
+    params = [[low for low, _ in ranges], [high for _, high in ranges]]
+    result = connection.execute_prepared(query, params)
+    return result
@@ -0,0 +1,78 @@
+from ..common.db import connection
+
+
+def query_indexes(table_name, schema='DBO'):
+    # (indexname, indexdef, valid) of every index on the table, a failed
+    # CREATE INDEX CONCURRENTLY leaves an index behind that is not valid
+    query = '''
+        SELECT i.indexname, i.indexdef, x.indisvalid
+        FROM pg_indexes AS i
+        JOIN pg_namespace AS n ON n.nspname = i.schemaname
+        JOIN pg_class AS c ON c.relname = i.indexname AND c.relnamespace = n.oid
+        JOIN pg_index AS x ON x.indexrelid = c.oid
+        WHERE i.schemaname = %s AND i.tablename = %s
+        ORDER BY i.indexname
+    '''
+    result = connection.executeSQL(query, [schema, table_name])
+    return result
+
+
+def query_table_stats(table_name, column, schema='DBO'):
+    '''
+    (estimated rows, pages, physical correlation of column) from the planner
+    statistics, correlation is None before the table was analyzed.
+    '''
+    query = '''
+        SELECT c.reltuples::bigint, c.relpages, s.correlation
+        FROM pg_class AS c
+        JOIN pg_namespace AS n ON n.oid = c.relnamespace
+        LEFT JOIN pg_stats AS s ON s.schemaname = n.nspname AND s.tablename = c.relname AND s.attname = %s
+        WHERE n.nspname = %s AND c.relname = %s
+    '''
+    result = connection.executeSQL(query, [column, schema, table_name])
+    return result[0] if result else None
+
+
+def explain_query(query, params, analyze=False):
+    # the JSON plan of query, analyze runs it for the actual rows and time
+    options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    result = connection.executeSQL(f'EXPLAIN ({options}) {query}', params)
+    return result[0][0][0]
+
+
+def index_valid(index_name, schema='DBO'):
+    # whether the index exists and can be used by the planner
+    query = '''
+        SELECT x.indisvalid
+        FROM pg_index AS x
+        JOIN pg_class AS c ON c.oid = x.indexrelid
+        JOIN pg_namespace AS n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s
+    '''
+    result = connection.executeSQL(query, [schema, index_name])
+    return bool(result and result[0][0])
+
+
+def create_index(index_name, table_name, columns, method='btree', schema='DBO'):
+    '''
+    CONCURRENTLY does not block writes, it needs the autocommit connection. The
+    build runs once: a failed one leaves an invalid index behind, which a retried
+    IF NOT EXISTS would keep without a word. Returns index_valid afterwards.
+    '''
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    query = f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" ON "{schema}"."{table_name}" USING {method} ({column_list})'
+    try:
+        connection.executeSQL(query, is_result=False, tries=1)
+    except ConnectionError:
+        # executeSQL logged the error, the catalog tells what the build left behind
+        pass
+    return index_valid(index_name, schema)
+
+
+def drop_index(index_name, schema='DBO'):
+    connection.executeSQL(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}"."{index_name}"', is_result=False)
+
+
+def vacuum_analyze(table_name, schema='DBO'):
+    # fresh statistics for the planner and a visibility map for index-only scans
+    connection.executeSQL(f'VACUUM (ANALYZE) "{schema}"."{table_name}"', is_result=False)
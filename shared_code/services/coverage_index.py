@@ -0,0 +1,101 @@
+import polars as pl
+from ..repository.dbo_transactions import query_timestamp, query_timestamp_ranges
+from ..repository.coverage_index import query_coverage, upsert_coverage
+from .timestamp_slots import (frequency_step_map, microsecond, is_aligned, last_slot,
+                              slot_grid, diff_slots, missing_slots, slot_runs, expand_runs)
+
+
+def outside_extent(coverage, start, last, frequency):
+    # the slot ranges of [start, last] before and after the stored extent
+    step = frequency_step_map[frequency]
+    extent_start, extent_end, _, _ = coverage
+    before, after = [], []
+    if start < extent_start:
+        before.append((start, min(last, extent_start - step)))
+    if last > extent_end:
+        after.append((max(start, extent_end + step), last))
+    return before, after
+
+
+def known_gaps(coverage, start, last):
+    # the stored gap runs clipped to [start, last]
+    _, _, gap_starts, gap_ends = coverage
+    ranges = []
+    for gap_start, gap_end in zip(gap_starts, gap_ends):
+        low, high = max(gap_start, start), min(gap_end, last)
+        if low <= high:
+            ranges.append((low, high))
+    return ranges
+
+
+def scan_ranges(coverage, start, last, frequency):
+    '''
+    Slot ranges of the window [start, last] that are not confirmed present yet:
+    the parts outside the stored extent plus the known gaps inside it, which
+    are rechecked because they may have been backfilled since.
+    '''
+    if coverage is None:
+        return [(start, last)]
+
+    before, after = outside_extent(coverage, start, last, frequency)
+    return before + known_gaps(coverage, start, last) + after
+
+
+def query_upper_bound(slot, end, frequency):
+    # a 30min slot owns every row up to the next half hour, but never past the window end
+    if frequency == '30min':
+        return min(slot + frequency_step_map[frequency] - microsecond, end)
+    return slot
+
+
+def save_coverage(table_name, frequency, coverage, start, last, scanned, missing):
+    if coverage is None:
+        extent_start, extent_end, gaps = start, last, missing
+    else:
+        step = frequency_step_map[frequency]
+        old_start, old_end, gap_starts, gap_ends = coverage
+        old_gaps = expand_runs(gap_starts, gap_ends, frequency)
+        gaps = [old_gaps.filter(~old_gaps.to_physical().is_in(scanned.to_physical())), missing]
+        # a window that does not touch the extent leaves a hole nobody has scanned yet
+        if start > old_end + step:
+            gaps.append(slot_grid(old_end + step, start - step, frequency))
+        if last < old_start - step:
+            gaps.append(slot_grid(last + step, old_start - step, frequency))
+        gaps = pl.concat(gaps).unique().sort()
+        extent_start, extent_end = min(old_start, start), max(old_end, last)
+
+    runs = slot_runs(gaps, frequency)
+    upsert_coverage(table_name, frequency, extent_start, extent_end,
+                    runs['start'].to_list(), runs['end'].to_list())
+
+
+def incremental_missing_slots(column, table_name, frequency, start, end):
+    '''
+    Gap scan that only reads the slots the coverage index cannot vouch for and
+    folds the result back into the index. Windows that are not aligned to the
+    frequency grid fall back to a full scan and leave the index untouched.
+    '''
+    if not is_aligned(start, frequency):
+        return missing_slots(query_timestamp(column, table_name, start, end), frequency, start, end)
+
+    step = frequency_step_map[frequency]
+    last = last_slot(start, end, frequency)
+    # when the window end cuts a 30min slot short only part of its rows count,
+    # so that slot is always scanned and never recorded in the index
+    partial = frequency == '30min' and end < last + step - microsecond
+    indexed_last = last - step if partial else last
+
+    coverage = query_coverage(table_name, frequency)
+    ranges = scan_ranges(coverage, start, indexed_last, frequency) if indexed_last >= start else []
+    if partial:
+        ranges.append((last, last))
+
+    bounds = [(low, query_upper_bound(high, end, frequency)) for low, high in ranges]
+    rows = query_timestamp_ranges(column, table_name, bounds)
+    scanned = expand_runs([low for low, _ in ranges], [high for _, high in ranges], frequency)
+    missing = diff_slots(scanned, rows, frequency)
+
+    if indexed_last >= start:
+        save_coverage(table_name, frequency, coverage, start, indexed_last,
+                      scanned.filter(scanned <= indexed_last), missing.filter(missing <= indexed_last))
+    return missing
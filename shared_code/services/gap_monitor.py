@@ -0,0 +1,116 @@
+import datetime
+import logging
+import os
+import polars as pl
+from ..repository.coverage_index import query_coverage
+from ..repository.dbo_transactions import query_timestamp, query_timestamp_ranges
+from .coverage_index import incremental_missing_slots, outside_extent, known_gaps, query_upper_bound
+from .timestamp_slots import (frequency_step_map, microsecond, is_aligned, floor_slot, last_slot,
+                              diff_slots, missing_slots, expand_runs)
+from .validation import table_column_map
+
+
+# the tables are stamped in NEM market time, UTC+10 all year
+utc_offset = datetime.timedelta(hours=float(os.getenv('MONITOR_UTC_OFFSET_HOURS', '10')))
+# where the first tick of a table without coverage starts
+lookback = datetime.timedelta(days=float(os.getenv('MONITOR_LOOKBACK_DAYS', '7')))
+# how far back a tick rechecks the recorded gaps, older gaps stay recorded as they are
+backfill_horizon = datetime.timedelta(days=float(os.getenv('MONITOR_BACKFILL_DAYS', '7')))
+
+
+def market_now():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + utc_offset
+
+
+def monitor_end(now, frequency):
+    # a 30min slot owns the half hour after it, the one still running is left for the next tick
+    if frequency == '30min':
+        return floor_slot(now, frequency) - microsecond
+    return floor_slot(now, frequency)
+
+
+def gap_slots(coverage, start, last, frequency):
+    # the recorded missing slots of [start, last]
+    gaps = [] if coverage is None else known_gaps(coverage, start, last)
+    return expand_runs([low for low, _ in gaps], [high for _, high in gaps], frequency)
+
+
+def monitor_start(coverage, end, frequency):
+    # MONITOR_BACKFILL_DAYS back, or from the end of the extent when the last tick is older than that
+    if coverage is None or coverage[0] > end:
+        return floor_slot(end - lookback, frequency)
+    extent_start, extent_end, _, _ = coverage
+    resume = extent_end + frequency_step_map[frequency]
+    return max(extent_start, min(floor_slot(end - backfill_horizon, frequency), resume))
+
+
+def monitor_table(table_name, now=None):
+    '''
+    One tick for table_name: the incremental engine up to now, so it only reads
+    the slots that arrived since the last tick and the known gaps of the last
+    MONITOR_BACKFILL_DAYS, which close once they are backfilled. Older gaps are
+    kept in the coverage index without being read again, so a gap that is never
+    filled does not make every tick longer. A table without coverage starts
+    MONITOR_LOOKBACK_DAYS back.
+    '''
+    column, frequency = table_column_map[table_name]
+    end = monitor_end(now or market_now(), frequency)
+    coverage = query_coverage(table_name, frequency)
+    start = monitor_start(coverage, end, frequency)
+    last = last_slot(start, end, frequency)
+
+    known = gap_slots(coverage, start, last, frequency).to_physical()
+    missing = incremental_missing_slots(column, table_name, frequency, start, end)
+    current = missing.to_physical()
+    return {
+        'table_name': table_name,
+        'start': start.isoformat(),
+        'end': last.isoformat(),
+        'gaps': missing.len(),
+        'opened': (~current.is_in(known)).sum(),
+        'closed': (~known.is_in(current)).sum(),
+    }
+
+
+def monitor_tick(table_names=None, now=None):
+    # monitor_table for every table of table_column_map, a failing table does not stop the others
+    now = now or market_now()
+    reports = []
+    for table_name in table_names or table_column_map:
+        try:
+            reports.append(monitor_table(table_name, now))
+        except Exception as e:
+            logging.error(f"Gap monitor failed for {table_name}: {e}")
+            reports.append({'table_name': table_name, 'error': str(e)})
+    return reports
+
+
+def monitored_missing_slots(column, table_name, frequency, start, end):
+    '''
+    engine='monitor': the missing slots of the window as the coverage index
+    recorded them at the last tick, without reading the table. Only the parts
+    of the window the index does not cover are scanned, and are not saved.
+    Windows that are not aligned to the frequency grid are scanned in full.
+    '''
+    if not is_aligned(start, frequency):
+        return missing_slots(query_timestamp(column, table_name, start, end, as_frame=True), frequency, start, end)
+
+    step = frequency_step_map[frequency]
+    last = last_slot(start, end, frequency)
+    # a 30min slot cut short by the window end is never in the index
+    partial = frequency == '30min' and end < last + step - microsecond
+    indexed_last = last - step if partial else last
+
+    coverage = query_coverage(table_name, frequency)
+    if coverage is None or indexed_last < start:
+        ranges, missing = [(start, last)], []
+    else:
+        before, after = outside_extent(coverage, start, indexed_last, frequency)
+        ranges = before + after + ([(last, last)] if partial else [])
+        missing = [gap_slots(coverage, start, indexed_last, frequency)]
+
+    if ranges:
+        bounds = [(low, query_upper_bound(high, end, frequency)) for low, high in ranges]
+        scanned = expand_runs([low for low, _ in ranges], [high for _, high in ranges], frequency)
+        missing.append(diff_slots(scanned, query_timestamp_ranges(column, table_name, bounds), frequency))
+    return pl.concat(missing).sort()
@@ -0,0 +1,129 @@
+import re
+from ..repository.dbo_transactions import timestamp_query, missing_timestamp_query
+from ..repository.table_indexes import (query_indexes, query_table_stats, explain_query, create_index, drop_index,
+                                        vacuum_analyze)
+from .validation import table_column_map, table_key_map
+
+
+# BRIN only pays off on big tables whose rows are stored in timestamp order,
+# it is a fraction of the btree size but can not answer index-only scans
+brin_min_rows = 10_000_000
+brin_min_correlation = 0.9
+
+
+def index_columns(indexdef):
+    # ('btree', ['SETTLEMENTDATE', 'REGIONID']) of a pg_indexes indexdef
+    match = re.search(r'USING (\w+) \(([^)]*)\)', indexdef)
+    if match is None:
+        return None, []
+    columns = [column.strip().split(' ')[0].strip('"') for column in match.group(2).split(',')]
+    return match.group(1), columns
+
+
+def leading_index(indexes, column):
+    # the first valid index that starts with column, None when the BETWEEN has nothing to use
+    for index_name, indexdef, valid in indexes:
+        method, columns = index_columns(indexdef)
+        if valid and columns and columns[0] == column:
+            return {'name': index_name, 'method': method, 'columns': columns}
+    return None
+
+
+def recommend_index(table_name, column, stats):
+    '''
+    brin on the timestamp column for big tables stored in timestamp order,
+    otherwise a btree on (timestamp, key) that covers the DISTINCT of both
+    the table and the per key gap queries.
+    '''
+    rows, _, correlation = stats
+    if rows >= brin_min_rows and correlation is not None and abs(correlation) >= brin_min_correlation:
+        return 'brin', [column]
+    key = table_key_map.get(table_name)
+    return 'btree', [column] + ([key] if key else [])
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def plan_summary(plan, table_name):
+    '''
+    How the plan reads table_name and what the planner expects it to cost, with
+    the actual time and rows when the plan came from EXPLAIN ANALYZE.
+    '''
+    root = plan['Plan']
+    scans = [node for node in plan_nodes(root) if node.get('Relation Name') == table_name]
+    summary = {
+        'scans': [node['Node Type'] + (f" using {node['Index Name']}" if 'Index Name' in node else '') for node in scans],
+        'seq_scan': any(node['Node Type'] == 'Seq Scan' for node in scans),
+        'estimated_cost': root['Total Cost'],
+        'estimated_rows': root['Plan Rows'],
+    }
+    if 'Execution Time' in plan:
+        summary['actual_time_ms'] = plan['Execution Time']
+        summary['actual_rows'] = root['Actual Rows']
+        summary['heap_fetches'] = sum(node.get('Heap Fetches', 0) for node in scans)
+    return summary
+
+
+def explain_gap_queries(table_name, column, frequency, start_timestamp, end_timestamp, analyze=False):
+    # the plans of the python engine's timestamp read and the sql engine's grid anti-join
+    window = [start_timestamp, end_timestamp]
+    return {
+        'python': plan_summary(explain_query(timestamp_query(column, table_name), window, analyze), table_name),
+        'sql': plan_summary(explain_query(missing_timestamp_query(column, table_name, frequency), window * 2, analyze),
+                            table_name),
+    }
+
+
+def advise_table(table_name, start_timestamp, end_timestamp, analyze=False, create=False):
+    '''
+    Index report of one table of table_column_map: its indexes, the plans of
+    the gap queries over the window and the index they need. create builds that
+    index CONCURRENTLY when no valid index starts with the timestamp column,
+    vacuums the table and explains the queries again under "after".
+    '''
+    column, frequency = table_column_map[table_name]
+    stats = query_table_stats(table_name, column)
+    if stats is None:
+        return {'table_name': table_name, 'error': 'TABLE NOT FOUND'}
+
+    indexes = query_indexes(table_name)
+    existing = leading_index(indexes, column)
+    method, columns = recommend_index(table_name, column, stats)
+    index_name = f'{table_name}_{column}_gap_idx'
+    before = explain_gap_queries(table_name, column, frequency, start_timestamp, end_timestamp, analyze)
+    report = {
+        'table_name': table_name,
+        'column': column,
+        'estimated_rows': stats[0],
+        'correlation': stats[2],
+        'indexes': [{'name': name, 'definition': indexdef, 'valid': valid} for name, indexdef, valid in indexes],
+        'leading_index': existing,
+        'seq_scan': any(plan['seq_scan'] for plan in before.values()),
+        'recommended': None if existing else {'name': index_name, 'method': method, 'columns': columns},
+        'before': before,
+    }
+
+    if create and existing is None:
+        # a failed concurrent build leaves an invalid index under the same name
+        if any(name == index_name and not valid for name, _, valid in indexes):
+            drop_index(index_name)
+        if not create_index(index_name, table_name, columns, method):
+            # an invalid index is still written on every insert, it is not left behind
+            drop_index(index_name)
+            report['error'] = 'INDEX NOT CREATED'
+            return report
+        vacuum_analyze(table_name)
+        report['created'] = index_name
+        report['after'] = explain_gap_queries(table_name, column, frequency, start_timestamp, end_timestamp, analyze)
+
+    return report
+
+
+def advise(start_timestamp, end_timestamp, table_names=None, analyze=False, create=False):
+    # advise_table for every table of table_column_map, or only table_names
+    for table_name in table_names or table_column_map:
+        yield advise_table(table_name, start_timestamp, end_timestamp, analyze=analyze, create=create)
@@ -0,0 +1,66 @@
+import datetime
+import polars as pl
+from concurrent.futures import ThreadPoolExecutor
+from ..common.db import connection
+from ..common.metrics import run_in_context
+from ..repository.dbo_transactions import query_timestamp
+from .coverage_index import query_upper_bound
+from .timestamp_slots import frequency_step_map, last_slot, missing_slots
+
+
+def month_starts(start, end):
+    # the first instant of every calendar month after start, up to end
+    month = datetime.datetime(start.year, start.month, 1)
+    while True:
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
+        if month > end:
+            return
+        yield month
+
+
+def window_partitions(start, end, frequency):
+    '''
+    The grid of [start, end] split at month boundaries, as (first_slot,
+    last_slot) pairs in order. A boundary is moved to the first grid slot at or
+    after it, the grid is anchored at start which need not be on the hour, so
+    every slot lands in exactly one partition.
+    '''
+    step = frequency_step_map[frequency]
+    last = last_slot(start, end, frequency)
+    firsts = [start]
+    for month in month_starts(start, last):
+        first = start - (start - month) // step * step
+        if firsts[-1] < first <= last:
+            firsts.append(first)
+    lasts = [first - step for first in firsts[1:]] + [last]
+    return list(zip(firsts, lasts))
+
+
+def scan_partition(column, table_name, frequency, first, last, end):
+    # the rows of a 30min slot run up to the next half hour, query_upper_bound
+    # reads them without reaching into the next partition's first slot
+    data = query_timestamp(column, table_name, first, query_upper_bound(last, end, frequency), as_frame=True)
+    return missing_slots(data, frequency, first, last)
+
+
+def scan_partition_pooled(*args):
+    with connection.pooled_connect():
+        return scan_partition(*args)
+
+
+def partitioned_missing_slots(column, table_name, frequency, start, end, max_workers=None):
+    '''
+    engine='partitioned': missing_slots of a long window as one scan per month,
+    up to max_workers (default the pool size) at once, each on its own pooled
+    connection. The sorted results of the partitions are concatenated in order.
+    Inside a pooled scan (concurrent=true) the pool may be taken by the other
+    tables, the partitions then run one after the other on the current connection.
+    '''
+    partitions = window_partitions(start, end, frequency)
+    args = [(column, table_name, frequency, first, last, end) for first, last in partitions]
+    if connection.pooled:
+        results = [scan_partition(*arg) for arg in args]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(partitions), max_workers or connection.max_pool_size)) as executor:
+            results = list(executor.map(run_in_context(lambda arg: scan_partition_pooled(*arg)), args))
+    return pl.concat(results)
@@ -0,0 +1,594 @@
+import asyncio
+import datetime
+import os
+from collections import deque
+import polars as pl
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from ..common.db import connection
+from ..common.metrics import stage, count, collect, table_scope, timed_chunks, run_in_context, as_dict, log_payload
+from ..repository.dbo_transactions import (query_timestamp, stream_timestamp, query_missing_timestamp,
+                                           query_missing_timestamps_batch,
+                                           query_missing_timestamp_async, query_key_timestamps,
+                                           query_keys, query_missing_key_timestamps)
+from .timestamp_slots import (parse_timestamp, rows_to_series, missing_slots, missing_slots_streaming,
+                              format_timestamps, compress_slots, missing_key_slots, format_key_slots,
+                              compress_key_slots)
+from .coverage_index import incremental_missing_slots
+from .partitioned_scan import partitioned_missing_slots
+from .gap_monitor import monitored_missing_slots
+from .result_cache import GapResultCache
+from .validation import table_column_map, table_key_map, engines, key_engines, outputs, formats, check_table_times
+import logging
+
+
+gap_cache = GapResultCache()
+
+# by_key without keys expects every key that has a row in this period before the window end
+key_lookback = datetime.timedelta(days=float(os.getenv('KEY_LOOKBACK_DAYS', '30')))
+
+
+def calculate_missing_timestamps(rows, frequency, start, end):
+
+    '''
+    sample parameter
+
+
+    rows = [
+        ['2021-01-01 00:00:00.000000'],
+        ['2021-01-01 00:05:00.000000'],
+        ['2021-01-01 00:10:00.000000'],
+        ['2021-01-01 00:15:00.000000'],
+        ['2021-01-01 00:20:00.000000'],
+        ['2021-01-01 00:25:00.000000'],
+        ['2021-01-01 00:30:00.000000'],
+        ...
+
+    ]
+    frequency = '5min'
+    start = '2021-01-01 00:00:00.000000'
+    end = '2021-01-01 00:00:00.000000'
+
+
+    return [
+        
+        '2021-01-01 00:00:00.000000',
+
+    ]
+    
+    
+    '''
+
+    return format_timestamps(missing_slots(rows, frequency, parse_timestamp(start), parse_timestamp(end)))
+
+
+def calculate_missing_timestamps_set(rows, frequency, start, end):
+    '''
+    Original set based implementation, kept as the reference for the benchmark.
+    '''
+
+    start = datetime.datetime.strptime(start, '%Y-%m-%d %H:%M:%S.%f')
+    end = datetime.datetime.strptime(end, '%Y-%m-%d %H:%M:%S.%f')
+    try:
+        if not rows or rows == []:
+            if frequency == '5min':
+                return [dt.isoformat() for dt in pl.datetime_range(start, end, '5m', eager=True)]
+            elif frequency == '30min':
+                return [dt.isoformat() for dt in pl.datetime_range(start, end, '30m', eager=True)]
+            elif frequency == 'H':
+                return [dt.isoformat() for dt in pl.datetime_range(start, end, '1h', eager=True)]
+        else:
+            rows = [row[0] for row in rows]
+            if frequency == '5min':
+                complete = pl.datetime_range(start, end, '5m', eager=True)
+                return [dt.isoformat() for dt in set(complete) - set(rows)]
+            elif frequency == '30min':
+                round_down = lambda dt: dt - datetime.timedelta(minutes=dt.minute % 30, seconds=dt.second, microseconds=dt.microsecond)
+                rows = [round_down(row) for row in rows]
+                complete = pl.datetime_range(start, end, '30m', eager=True)
+                return [dt.isoformat() for dt in set(complete) - set(rows)]
+            elif frequency == 'H':
+                complete = pl.datetime_range(start, end, '1h', eager=True)
+                return [dt.isoformat() for dt in set(complete) - set(rows)]
+            
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+def find_missing_slots(column, table_name, frequency, start_timestamp, end_timestamp, engine='python'):
+    # a batch of one table is the sql engine
+    if engine in ('sql', 'batch'):
+        return rows_to_series(query_missing_timestamp(column, table_name, frequency, start_timestamp, end_timestamp))
+
+    start, end = parse_timestamp(start_timestamp), parse_timestamp(end_timestamp)
+    if engine == 'incremental':
+        return incremental_missing_slots(column, table_name, frequency, start, end)
+
+    if engine == 'partitioned':
+        return partitioned_missing_slots(column, table_name, frequency, start, end)
+
+    if engine == 'monitor':
+        return monitored_missing_slots(column, table_name, frequency, start, end)
+
+    if engine == 'stream':
+        batches = stream_timestamp(column, table_name, start_timestamp, end_timestamp)
+        return missing_slots_streaming(batches, frequency, start, end)
+
+    data = query_timestamp(column, table_name, start_timestamp, end_timestamp, as_frame=True)
+    logging.info(f"Data: {data.height} rows")
+    return missing_slots(data, frequency, start, end)
+
+
+def find_missing_key_slots(column, key, table_name, frequency, start_timestamp, end_timestamp, keys=None,
+                           engine='python'):
+    '''
+    The (key, slot) frame of every key's missing slots, sql and batch diff in
+    the database, python reads the (key, timestamp) pairs and diffs in polars.
+    keys None expects the keys of the table over key_lookback up to the window
+    end, so a key without a row in the whole window is still reported. None
+    when the table has no key at all there.
+    '''
+    if keys is None:
+        end = parse_timestamp(end_timestamp)
+        keys = query_keys(column, key, table_name, min(parse_timestamp(start_timestamp), end - key_lookback), end)
+        if not keys:
+            return None
+
+    if engine in ('sql', 'batch'):
+        return query_missing_key_timestamps(column, key, table_name, frequency, start_timestamp, end_timestamp, keys)
+
+    data = query_key_timestamps(column, key, table_name, start_timestamp, end_timestamp)
+    logging.info(f"Data: {data.height} rows")
+    return missing_key_slots(data, frequency, parse_timestamp(start_timestamp), parse_timestamp(end_timestamp), keys)
+
+
+def find_table_slots(table_name, times, engine='python', by_key=False):
+    column, frequency = table_column_map[table_name]
+    if by_key:
+        return find_missing_key_slots(column, table_key_map[table_name], table_name, frequency,
+                                      times['start_datetime'], times['end_datetime'], times.get('keys'), engine)
+    return find_missing_slots(column, table_name, frequency, times['start_datetime'], times['end_datetime'], engine)
+
+
+async def find_missing_slots_async(column, table_name, frequency, start_timestamp, end_timestamp, engine='python'):
+    # sql awaits asyncpg, it only returns the missing slots. The other engines
+    # run in a thread on a pooled psycopg2 connection, python keeps its COPY
+    # into polars instead of boxing every timestamp in an asyncpg Record
+    if engine == 'sql':
+        start, end = parse_timestamp(start_timestamp), parse_timestamp(end_timestamp)
+        return rows_to_series(await query_missing_timestamp_async(column, table_name, frequency, start, end))
+
+    def find_pooled():
+        # the partitions check out their own pooled connections
+        if engine == 'partitioned':
+            return find_missing_slots(column, table_name, frequency, start_timestamp, end_timestamp, engine)
+        with connection.pooled_connect():
+            return find_missing_slots(column, table_name, frequency, start_timestamp, end_timestamp, engine)
+    return await asyncio.to_thread(find_pooled)
+
+
+async def find_table_slots_async(table_name, times, engine='python', by_key=False):
+    if by_key:
+        def find_pooled():
+            with connection.pooled_connect():
+                return find_table_slots(table_name, times, engine, by_key)
+        return await asyncio.to_thread(find_pooled)
+
+    column, frequency = table_column_map[table_name]
+    return await find_missing_slots_async(column, table_name, frequency, times['start_datetime'],
+                                          times['end_datetime'], engine)
+
+
+def slots_cache_key(table_name, times, by_key=False):
+    # the engines that answer from the data return the same slots, so the engine is
+    # not part of the key. monitor can be a tick behind the table and is never stored
+    cache_key = (table_name, parse_timestamp(times['start_datetime']), parse_timestamp(times['end_datetime']))
+    if by_key:
+        keys = times.get('keys')
+        cache_key += ('by_key', None if keys is None else tuple(sorted(set(keys))))
+    return cache_key
+
+
+def table_report(table_name, times, slots):
+    report = {
+        'table_name': table_name,
+        'start_datetime': times['start_datetime'],
+        'end_datetime': times['end_datetime'],
+        # by key: the number of missing (key, slot) pairs
+        'count_datetime': len(slots),
+        'frequency': table_column_map[table_name][1]
+    }
+    if isinstance(slots, pl.DataFrame):
+        report['key_column'] = table_key_map[table_name]
+    return report
+
+
+def scan_table(table_name, times, engine='python', use_cache=True, by_key=False):
+    '''
+    Validate one table_times entry and find its missing slots. Returns the
+    report without the missing field plus the slots series, slots is None when
+    the report is an error. by_key returns a (key, slot) frame instead.
+    '''
+    error = check_table_times(table_name, times, by_key)
+    if error is not None:
+        return error, None
+
+    column = table_column_map[table_name][0]
+    frequency = table_column_map[table_name][1]
+    logging.info(f"Column: {column}")
+    logging.info(f"Frequency: {frequency}")
+
+    with table_scope(table_name):
+        cache_key = slots_cache_key(table_name, times, by_key)
+        slots = gap_cache.get(cache_key) if use_cache else None
+        count('cache_hits', slots is not None)
+        if slots is None:
+            slots = find_table_slots(table_name, times, engine, by_key)
+            if slots is None:
+                # by_key without keys on a table that had no row over key_lookback
+                return {'table_name': table_name, 'error': 'NO KEYS FOUND'}, None
+            if use_cache and engine != 'monitor':
+                gap_cache.put(cache_key, slots, cache_key[2])
+        count('gaps', len(slots))
+
+    return table_report(table_name, times, slots), slots
+
+
+def scan_tables_batched(table_times, use_cache=True):
+    '''
+    engine='batch': the tables that are valid and not cached are answered by a
+    single query_missing_timestamps_batch round-trip, the (scan, slot) result is
+    split back per table. Yields (report, slots) in the order of table_times.
+    '''
+    found, scans = {}, []
+    for table_name, times in table_times.items():
+        if check_table_times(table_name, times) is not None:
+            continue
+        slots = gap_cache.get(slots_cache_key(table_name, times)) if use_cache else None
+        if slots is None:
+            column, frequency = table_column_map[table_name]
+            scans.append((table_name, column, frequency, times['start_datetime'], times['end_datetime']))
+        else:
+            found[table_name] = slots
+
+    scanned = {scan[0] for scan in scans}
+    if scans:
+        missing = query_missing_timestamps_batch(scans)
+        for scan, (table_name, *_) in enumerate(scans):
+            with table_scope(table_name), stage('diff'):
+                slots = rows_to_series(missing.filter(pl.col('scan') == scan).select('slot'))
+            found[table_name] = slots
+            if use_cache:
+                cache_key = slots_cache_key(table_name, table_times[table_name])
+                gap_cache.put(cache_key, slots, cache_key[2])
+
+    for table_name, times in table_times.items():
+        error = check_table_times(table_name, times)
+        if error is not None:
+            yield error, None
+        else:
+            with table_scope(table_name):
+                count('cache_hits', table_name not in scanned)
+                count('gaps', len(found[table_name]))
+            yield table_report(table_name, times, found[table_name]), found[table_name]
+
+
+def scan_table_pooled(table_name, times, **options):
+    with connection.pooled_connect():
+        return scan_table(table_name, times, **options)
+
+
+def map_ahead(executor, func, *iterables, ahead=None):
+    # executor.map that submits at most `ahead` calls past the result being consumed, None submits all at once
+    if ahead is None:
+        yield from executor.map(func, *iterables)
+        return
+    futures = deque()
+    for args in zip(*iterables):
+        futures.append(executor.submit(func, *args))
+        if len(futures) > ahead:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+
+def scan_tables(table_times, engine='python', concurrent=False, use_cache=True, by_key=False, ahead=None):
+    '''
+    Lazily yields (report, slots) in the order of table_times, by_key tables
+    are scanned one query each, also with the batch engine. concurrent scans
+    the tables in parallel, ahead bounds how many run past the table being
+    consumed, so a streamed report holds at most ahead + 1 tables' slots.
+    '''
+    if engine == 'batch' and not by_key:
+        yield from scan_tables_batched(table_times, use_cache=use_cache)
+    elif concurrent and len(table_times) > 1:
+        workers = min(len(table_times), connection.max_pool_size, (ahead or len(table_times)) + 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            yield from map_ahead(executor, run_in_context(partial(scan_table_pooled, engine=engine,
+                                                                  use_cache=use_cache, by_key=by_key)),
+                                 table_times.keys(), table_times.values(), ahead=ahead)
+    else:
+        for table_name, times in table_times.items():
+            yield scan_table(table_name, times, engine=engine, use_cache=use_cache, by_key=by_key)
+
+
+async def scan_table_async(table_name, times, engine='python', use_cache=True, by_key=False):
+    # scan_table awaiting the database instead of blocking on it
+    error = check_table_times(table_name, times, by_key)
+    if error is not None:
+        return error, None
+
+    with table_scope(table_name):
+        cache_key = slots_cache_key(table_name, times, by_key)
+        slots = gap_cache.get(cache_key) if use_cache else None
+        count('cache_hits', slots is not None)
+        if slots is None:
+            slots = await find_table_slots_async(table_name, times, engine, by_key)
+            if slots is None:
+                # by_key without keys on a table that had no row over key_lookback
+                return {'table_name': table_name, 'error': 'NO KEYS FOUND'}, None
+            if use_cache and engine != 'monitor':
+                gap_cache.put(cache_key, slots, cache_key[2])
+        count('gaps', len(slots))
+
+    return table_report(table_name, times, slots), slots
+
+
+async def scan_tables_async(table_times, engine='python', concurrent=False, use_cache=True, by_key=False):
+    # concurrent has every table in flight at once, the pool bounds the queries actually running
+    if engine == 'batch' and not by_key:
+        def scan_batched_pooled():
+            with connection.pooled_connect():
+                return list(scan_tables_batched(table_times, use_cache=use_cache))
+        return await asyncio.to_thread(scan_batched_pooled)
+    scans = (scan_table_async(table_name, times, engine=engine, use_cache=use_cache, by_key=by_key)
+             for table_name, times in table_times.items())
+    if concurrent:
+        return await asyncio.gather(*scans)
+    return [await scan for scan in scans]
+
+
+def build_report(report, slots, output='list'):
+    if slots is None:
+        return report
+
+    if isinstance(slots, pl.DataFrame) and output == 'ranges':
+        missing_key, missing_timestamps = 'missing_ranges_by_key', compress_key_slots(slots, report['frequency'])
+    elif isinstance(slots, pl.DataFrame):
+        missing_key, missing_timestamps = 'missing_by_key', format_key_slots(slots)
+    elif output == 'ranges':
+        missing_key, missing_timestamps = 'missing_ranges', compress_slots(slots, report['frequency'])
+    else:
+        missing_key, missing_timestamps = 'missing_datetime', format_timestamps(slots)
+    log_payload("Missing timestamps: %s", missing_timestamps)
+    table_name, *fields = report.items()
+    return dict([table_name, (missing_key, missing_timestamps), *fields])
+
+
+def timed_report(report, slots, output='list'):
+    # build_report, timed as the table's serialize stage
+    with table_scope(None if slots is None else report['table_name']), stage('serialize'):
+        return build_report(report, slots, output)
+
+
+def encode_report(report, slots, output='list', chunk_size=10000):
+    '''
+    Same JSON as json.dumps(build_report(...)), but the missing_datetime list is
+    formatted and encoded chunk_size slots at a time.
+    '''
+    if slots is None or output == 'ranges' or isinstance(slots, pl.DataFrame):
+        yield json.dumps(build_report(report, slots, output))
+        return
+
+    table_name, *fields = report.items()
+    yield json.dumps(dict([table_name]))[:-1] + ', "missing_datetime": ['
+    for offset in range(0, len(slots), chunk_size):
+        if offset:
+            yield ', '
+        yield json.dumps(format_timestamps(slots.slice(offset, chunk_size)))[1:-1]
+    yield '], ' + json.dumps(dict(fields))[1:]
+
+
+def report_chunks(table_times, fmt='json', engine='python', concurrent=False, output='list',
+                  use_cache=True, chunk_size=10000, by_key=False):
+    # the table reports of stream_report, for json without the closing brace
+    if fmt == 'json':
+        yield '{"table_times": ['
+
+    # one table is scanned ahead while the previous one is written
+    scans = scan_tables(table_times, engine=engine, concurrent=concurrent, use_cache=use_cache, by_key=by_key,
+                        ahead=1)
+    for index, (report, slots) in enumerate(scans):
+        if index and fmt == 'json':
+            yield ', '
+        yield from timed_chunks(encode_report(report, slots, output, chunk_size),
+                                None if slots is None else report['table_name'])
+        if fmt == 'ndjson':
+            yield '\n'
+
+    if fmt == 'json':
+        yield ']'
+
+
+def stream_report(table_times, fmt='json', engine='python', concurrent=False, output='list',
+                  use_cache=True, cache_stats=False, chunk_size=10000, timings=False, by_key=False):
+    '''
+    Generator version of run(): each table is written as soon as it is scanned,
+    so only one table's slots are held at a time (two with concurrent) and the
+    first table goes out before the last one is computed.
+
+    fmt = 'json'   the same document as run(), written in chunks
+    fmt = 'ndjson' one table report per line, then a {"cache": ...} line when
+                   cache_stats and a {"timings": ...} line when timings
+    '''
+    if engine not in engines:
+        raise ValueError(f"Unknown engine {engine}, expected one of {engines}")
+
+    if output not in outputs:
+        raise ValueError(f"Unknown output {output}, expected one of {outputs}")
+
+    if by_key and engine not in key_engines:
+        raise ValueError(f"Engine {engine} has no by_key mode, expected one of {key_engines}")
+
+    if fmt not in formats:
+        raise ValueError(f"Unknown format {fmt}, expected one of {formats}")
+
+    with collect() if timings else nullcontext() as collector:
+        for chunk in report_chunks(table_times, fmt=fmt, engine=engine, concurrent=concurrent, output=output,
+                                   use_cache=use_cache, chunk_size=chunk_size, by_key=by_key):
+            count('bytes', len(chunk))
+            yield chunk
+
+        extra = {}
+        if cache_stats:
+            extra['cache'] = gap_cache.stats()
+        if collector is not None:
+            extra['timings'] = as_dict(collector)
+
+        if fmt == 'json':
+            yield ''.join(f', "{key}": ' + json.dumps(value) for key, value in extra.items()) + '}'
+        else:
+            yield ''.join(json.dumps({key: value}) + '\n' for key, value in extra.items())
+
+
+def encode_result(result, collector=None):
+    # json.dumps(result), with the request's timings added when it collected them
+    with stage('serialize'):
+        body = json.dumps(result)
+    if collector is None:
+        return body
+    count('bytes', len(body))
+    return body[:-1] + ', "timings": ' + json.dumps(as_dict(collector)) + '}'
+
+
+def run(table_times, engine='python', concurrent=False, output='list', use_cache=True, cache_stats=False,
+        timings=False, by_key=False):
+
+    '''
+    sample parameter
+
+
+    table_times = {
+        
+        'REGIONSUM': {
+            'start_timestamp': '2021-01-01 00:00:00.000000',
+            'end_timestamp': '2021-01-01 00:00:00.000000'
+        },
+        'PRICE': {
+            'start_timestamp': '2021-01-01 00:00:00.000000',
+            'end_timestamp': '2021-01-01 00:00:00.000000'
+        },
+        'INTERCONNECTORRES': {
+            'start_timestamp': '2021-01-01 00:00:00.000000',
+            'end_timestamp': '2021-01-01 00:00:00.000000'
+        },
+
+    engine = 'python' | 'sql' | 'incremental' | 'stream' | 'batch' | 'partitioned' | 'monitor'
+
+    concurrent = True scans the tables in parallel, each on its own pooled
+    connection, results keep the order of table_times. The batch engine
+    already answers all tables with one query and ignores it
+
+    output = 'list' | 'ranges', count_datetime is the number of missing slots either way
+
+    use_cache = False skips the in-process gap_cache, cache_stats = True adds
+    its hit/miss counters to the result under "cache"
+
+    timings = True adds the per stage timings of the request (common/metrics.py)
+    under "timings"
+
+    by_key = True checks every region or interconnector (table_key_map) on its
+    own, the report has missing_by_key {key: [...]} (missing_ranges_by_key with
+    output='ranges') and key_column. An entry's optional "keys" list names the
+    keys that must be present, by default the keys found in the window
+    
+    '''
+
+    if engine not in engines:
+        raise ValueError(f"Unknown engine {engine}, expected one of {engines}")
+
+    if output not in outputs:
+        raise ValueError(f"Unknown output {output}, expected one of {outputs}")
+
+    if by_key and engine not in key_engines:
+        raise ValueError(f"Engine {engine} has no by_key mode, expected one of {key_engines}")
+
+    with collect() if timings else nullcontext() as collector:
+        result = {"table_times": []}
+
+        for report, slots in scan_tables(table_times, engine=engine, concurrent=concurrent, use_cache=use_cache,
+                                         by_key=by_key):
+            result['table_times'].append(timed_report(report, slots, output))
+
+        if cache_stats:
+            result['cache'] = gap_cache.stats()
+
+        body = encode_result(result, collector)
+
+
+
+    '''
+    sample result 
+
+    {
+        "table_times": [
+            {
+                "table_name": "REGIONSUM",
+                "missing_timestamps": [
+                    "2021-01-01T00:00:00.000000",
+                    "2021-01-01T00:05:00.000000",
+                    "2021-01-01T00:10:00.000000",
+                    "2021-01-01T00:15:00.000000",
+                    "2021-01-01T00:20:00.000000",
+                    "2021-01-01T00:25:00.000000",
+                    "2021-01-01T00:30:00.000000",
+                    "2021-01-01T00:35:00.000000",
+                    "2021-01-01T00:40:00.000000",
+                    "2021-01-01T00:45:00.000000",
+                    "2021-01-01T00:50:00.000000",
+                    "2021-01-01T00:55:00.000000"
+                ],
+                "start_timestamp": "2021-01-01 00:00:00.000000",
+                "end_timestamp": "2021-01-01 00:00:00.000000",
+                "length": 12,
+                "frequency": "5min"
+            },
+    
+    '''
+
+
+
+
+        
+    return body
+        
+
+
+async def run_async(table_times, engine='python', concurrent=False, output='list', use_cache=True,
+                    cache_stats=False, timings=False, by_key=False):
+    '''
+    run() for async callers, same arguments and result. sql awaits its query
+    on the asyncpg pool of async_connection, the other engines run in a thread
+    on a pooled DatabaseUtil connection. concurrent scans the tables at once,
+    otherwise one after the other like run().
+    '''
+    if engine not in engines:
+        raise ValueError(f"Unknown engine {engine}, expected one of {engines}")
+
+    if output not in outputs:
+        raise ValueError(f"Unknown output {output}, expected one of {outputs}")
+
+    if by_key and engine not in key_engines:
+        raise ValueError(f"Engine {engine} has no by_key mode, expected one of {key_engines}")
+
+    with collect() if timings else nullcontext() as collector:
+        result = {"table_times": [timed_report(report, slots, output)
+                                  for report, slots in await scan_tables_async(table_times, engine=engine,
+                                                                               concurrent=concurrent,
+                                                                               use_cache=use_cache,
+                                                                               by_key=by_key)]}
+        if cache_stats:
+            result['cache'] = gap_cache.stats()
+        return encode_result(result, collector)
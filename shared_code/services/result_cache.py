@@ -0,0 +1,88 @@
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+
+class GapResultCache:
+    '''
+    Bounded LRU cache of per-table missing slot series, shared by the warm worker.
+
+    Windows that ended more than `historical_after` ago do not change any more
+    and never expire, windows closer to now live for `live_ttl` seconds.
+    Entries are evicted least recently used first once `max_entries` or
+    `max_bytes` (the polars estimated size of the cached series) is exceeded.
+    '''
+
+    def __init__(self,
+                 max_entries: int = 256,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 live_ttl: int = 60,
+                 historical_after: datetime.timedelta = datetime.timedelta(days=1)):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.live_ttl = live_ttl
+        self.historical_after = historical_after
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def expires_at(self, end):
+        if end < datetime.datetime.now() - self.historical_after:
+            return None
+        return time.monotonic() + self.live_ttl
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                self.drop(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, slots, end):
+        size = slots.estimated_size()
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.drop(key)
+            self.entries[key] = (self.expires_at(end), slots, size)
+            self.size += size
+
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self.drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def drop(self, key):
+        _, _, size = self.entries.pop(key)
+        self.size -= size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
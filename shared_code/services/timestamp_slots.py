@@ -0,0 +1,226 @@
+import datetime
+import polars as pl
+from ..common.metrics import stage
+
+
+# polars interval of one slot for each frequency
+frequency_every_map = {
+    '5min': '5m',
+    '30min': '30m',
+    'H': '1h',
+}
+
+frequency_step_map = {
+    '5min': datetime.timedelta(minutes=5),
+    '30min': datetime.timedelta(minutes=30),
+    'H': datetime.timedelta(hours=1),
+}
+
+epoch = datetime.datetime(1970, 1, 1)
+microsecond = datetime.timedelta(microseconds=1)
+
+
+def parse_timestamp(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f')
+
+
+def is_aligned(value, frequency):
+    return (value - epoch) % frequency_step_map[frequency] == datetime.timedelta(0)
+
+
+def floor_slot(value, frequency):
+    # the grid slot at or before value, on the epoch anchored grid of is_aligned
+    step = frequency_step_map[frequency]
+    return epoch + (value - epoch) // step * step
+
+
+def last_slot(start, end, frequency):
+    step = frequency_step_map[frequency]
+    return start + (end - start) // step * step
+
+
+def rows_to_series(rows):
+    # a frame from query_to_polars is already columnar, only the first column counts
+    if isinstance(rows, pl.DataFrame):
+        return rows.to_series(0).cast(pl.Datetime('us')).alias('slot')
+
+    # psycopg2 hands back boxed datetimes, turning them into epoch microseconds
+    # first is several times cheaper than letting polars convert the objects
+    values = [(row[0] - epoch) // microsecond for row in rows or []]
+    return pl.Series('slot', values, dtype=pl.Int64).cast(pl.Datetime('us'))
+
+
+def slot_grid(start, end, frequency):
+    return pl.datetime_range(start, end, frequency_every_map[frequency], time_unit='us', eager=True).alias('slot')
+
+
+def present_slots(rows, frequency):
+    present = rows_to_series(rows)
+    if frequency == '30min':
+        present = present.dt.truncate(frequency_every_map[frequency])
+    return present.to_physical()
+
+
+def diff_slots(complete, rows, frequency):
+    return complete.filter(~complete.to_physical().is_in(present_slots(rows, frequency)))
+
+
+def missing_slots(rows, frequency, start, end):
+    '''
+    Columnar grid diff: the present timestamps are bucketed with dt.truncate and
+    the set difference runs as is_in over the int64 epoch values. The result is
+    a sorted Datetime series.
+    '''
+    with stage('grid'):
+        complete = slot_grid(start, end, frequency)
+    with stage('diff'):
+        return diff_slots(complete, rows, frequency)
+
+
+def missing_slots_streaming(batches, frequency, start, end):
+    '''
+    missing_slots over an iterable of row batches, only the grid, a found mask
+    and the current batch are in memory however many rows the window has.
+    '''
+    with stage('grid'):
+        complete = slot_grid(start, end, frequency)
+        physical = complete.to_physical()
+        found = pl.repeat(False, len(complete), eager=True)
+    for rows in batches:
+        with stage('diff'):
+            found = found | physical.is_in(present_slots(rows, frequency))
+    with stage('diff'):
+        return complete.filter(~found)
+
+
+def timestamp_format(slots):
+    # same strings as datetime.isoformat, the fraction only shows when it is not zero
+    return '%Y-%m-%dT%H:%M:%S%.6f' if (slots.dt.microsecond() != 0).any() else '%Y-%m-%dT%H:%M:%S'
+
+
+def missing_key_slots(present, frequency, start, end, keys):
+    '''
+    missing_slots for every key at once. present is a (key, timestamp) frame of
+    the rows found, keys the keys that need a row in every slot. Every (key, slot) pair of the key x grid product is
+    numbered key_index * len(grid) + slot_index, the present rows are turned
+    into those numbers and the numbers not found are the gaps, so no frame of
+    the whole product is built. Returns a (key, slot) frame sorted by key and slot.
+    '''
+    key, timestamp = present.columns
+    present = present.select(pl.col(key).cast(pl.Utf8).alias('key'),
+                             pl.col(timestamp).cast(pl.Datetime('us')).alias('slot'))
+    if frequency == '30min':
+        present = present.with_columns(pl.col('slot').dt.truncate(frequency_every_map[frequency]))
+    keys = pl.Series('key', list(keys), dtype=pl.Utf8).unique().sort()
+
+    with stage('grid'):
+        grid = slot_grid(start, end, frequency)
+    with stage('diff'):
+        size, step = len(grid), frequency_step_map[frequency] // microsecond
+        # rows off the grid match no slot, like the is_in of diff_slots
+        offset = pl.col('slot').to_physical() - (start - epoch) // microsecond
+        found = (
+            present.join(keys.to_frame().with_row_count('key_index'), on='key')
+            .filter((offset >= 0) & (offset < size * step) & (offset % step == 0))
+            .select(pl.col('key_index').cast(pl.Int64) * size + offset // step)
+            .to_series()
+        )
+        pairs = pl.int_range(0, len(keys) * size, eager=True)
+        missing = pairs.filter(~pairs.is_in(found))
+        return pl.DataFrame({'key': keys.gather(missing // size), 'slot': grid.gather(missing % size)})
+
+
+def format_timestamps(slots):
+    if slots.is_empty():
+        return []
+    return slots.dt.to_string(timestamp_format(slots)).to_list()
+
+
+def slot_runs(slots, frequency):
+    '''
+    Runs of consecutive slots in a sorted series as a start/end/count frame,
+    a new run starts wherever the gap to the previous slot is not one step.
+    '''
+    step = frequency_step_map[frequency] // microsecond
+    run_id = (slots.to_physical().diff() != step).fill_null(True).cum_sum()
+    return (
+        pl.DataFrame({'slot': slots, 'run': run_id})
+        .group_by('run', maintain_order=True)
+        .agg(
+            pl.col('slot').first().alias('start'),
+            pl.col('slot').last().alias('end'),
+            pl.col('slot').count().alias('count'),
+        )
+    )
+
+
+def compress_slots(slots, frequency):
+    '''
+    return [
+        {'start': '2021-01-01T00:00:00', 'end': '2021-01-01T00:55:00', 'count': 12},
+    ]
+    '''
+    if slots.is_empty():
+        return []
+
+    ranges = slot_runs(slots, frequency)
+    return [
+        {'start': start, 'end': end, 'count': count}
+        for start, end, count in zip(format_timestamps(ranges['start']),
+                                     format_timestamps(ranges['end']),
+                                     ranges['count'].to_list())
+    ]
+
+
+def format_key_slots(missing):
+    # {key: [timestamps]} of a (key, slot) frame, keys without a gap are left out
+    if missing.is_empty():
+        return {}
+    grouped = (
+        missing.with_columns(pl.col('slot').dt.to_string(timestamp_format(missing['slot'])))
+        .group_by('key', maintain_order=True)
+        .agg('slot')
+    )
+    return dict(zip(grouped['key'].to_list(), grouped['slot'].to_list()))
+
+
+def compress_key_slots(missing, frequency):
+    '''
+    compress_slots per key of a sorted (key, slot) frame, the runs of every key
+    are found in one pass: a run also ends where the key changes.
+
+    return {
+        'NSW1': [{'start': '2021-01-01T00:00:00', 'end': '2021-01-01T00:55:00', 'count': 12}],
+    }
+    '''
+    if missing.is_empty():
+        return {}
+
+    step = frequency_step_map[frequency] // microsecond
+    slot = pl.col('slot')
+    new_run = (slot.to_physical().diff() != step) | (pl.col('key') != pl.col('key').shift())
+    ranges = (
+        missing.with_columns(new_run.fill_null(True).cum_sum().alias('run'))
+        .group_by('run', maintain_order=True)
+        .agg(
+            pl.col('key').first(),
+            slot.first().alias('start'),
+            slot.last().alias('end'),
+            slot.count().alias('count'),
+        )
+    )
+    out = {}
+    for key, start, end, count in zip(ranges['key'].to_list(),
+                                      format_timestamps(ranges['start']),
+                                      format_timestamps(ranges['end']),
+                                      ranges['count'].to_list()):
+        out.setdefault(key, []).append({'start': start, 'end': end, 'count': count})
+    return out
+
+
+def expand_runs(starts, ends, frequency):
+    # inverse of slot_runs, one grid per run so only the runs are looped over
+    grids = [slot_grid(start, end, frequency) for start, end in zip(starts, ends)]
+    if not grids:
+        return pl.Series('slot', [], dtype=pl.Datetime('us'))
+    return pl.concat(grids)
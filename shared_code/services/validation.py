@@ -0,0 +1,93 @@
+'''
+Request validation that only needs the standard library, so the function can
+answer invalid requests without importing pandas, polars or the database layer.
+'''
+
+
+table_column_map = {
+    'REGIONSUM': ['SETTLEMENTDATE', '5min'],
+    'PRICE': ['SETTLEMENTDATE', '5min'],
+    'INTERCONNECTORRES': ['SETTLEMENTDATE', '5min'],
+    'PREDISPATCHPRICE': ['LASTCHANGED', '30min'],
+    'PREDISPATCHREGIONSUM': ['LASTCHANGED', '30min'],
+    'PREDISPATCHINTERCONNECTORRES': ['LASTCHANGED', '30min'],
+    'P5MIN_REGIONSOLUTION': ['RUN_DATETIME', '5min'],
+    'P5MIN_INTERCONNECTORSOLN': ['RUN_DATETIME', '5min'],
+    'STPASA_REGIONSOLUTION': ['RUN_DATETIME', 'H'],
+    'STPASA_INTERCONNECTORSOLN': ['RUN_DATETIME', 'H']
+}
+
+# key column of the tables that hold one row per region or interconnector and slot,
+# by_key requests find the missing slots of every key instead of the table
+table_key_map = {
+    'REGIONSUM': 'REGIONID',
+    'PRICE': 'REGIONID',
+    'INTERCONNECTORRES': 'INTERCONNECTORID',
+    'PREDISPATCHPRICE': 'REGIONID',
+    'PREDISPATCHREGIONSUM': 'REGIONID',
+    'PREDISPATCHINTERCONNECTORRES': 'INTERCONNECTORID',
+    'P5MIN_REGIONSOLUTION': 'REGIONID',
+    'P5MIN_INTERCONNECTORSOLN': 'INTERCONNECTORID',
+    'STPASA_REGIONSOLUTION': 'REGIONID',
+    'STPASA_INTERCONNECTORSOLN': 'INTERCONNECTORID'
+}
+
+# python: COPY the present timestamps into polars and diff them in the function
+# sql: let PostgreSQL anti-join the grid and return only the missing slots
+# incremental: only scan what the coverage index has not confirmed present yet
+# stream: python engine over a server-side cursor, memory bounded by the grid instead of the rows
+# batch: sql engine for every table of the request in a single UNION ALL round-trip
+# partitioned: python engine per calendar month of the window, the months scanned in parallel
+# monitor: answer from the gaps the GapMonitor timer recorded, only scan what it has not covered
+engines = ('python', 'sql', 'incremental', 'stream', 'batch', 'partitioned', 'monitor')
+
+# the engines with a by_key mode: python diffs the (key, timestamp) pairs in polars,
+# sql and batch anti-join every key's grid in the database, table by table
+key_engines = ('python', 'sql', 'batch')
+
+# list: every missing slot, ranges: consecutive missing slots collapsed to {start, end, count}
+outputs = ('list', 'ranges')
+
+# streaming formats of stream_report
+formats = ('json', 'ndjson')
+
+
+def check_table_times(table_name, times, by_key=False):
+    # the error report of an invalid table_times entry, None when it is valid, keys is only read by_key
+    start_timestamp = times.get('start_datetime')
+    end_timestamp = times.get('end_datetime')
+
+    if not start_timestamp or not end_timestamp or start_timestamp > end_timestamp:
+        return {
+            'table_name': table_name,
+            'error': 'INVALID TIMESTAMP',
+        }
+
+    if not table_name or table_name not in table_column_map:
+        return {
+            'table_name': table_name,
+            'error': 'TABLE NOT FOUND',
+        }
+
+    keys = times.get('keys') if by_key else None
+    if keys is not None and (not isinstance(keys, list) or not all(isinstance(key, str) for key in keys)):
+        return {
+            'table_name': table_name,
+            'error': 'INVALID KEYS',
+        }
+
+    return None
+
+
+def error_reports(table_times, by_key=False):
+    '''
+    The reports of table_times when every entry is invalid, None as soon as one
+    entry has to be scanned.
+    '''
+    reports = []
+    for table_name, times in table_times.items():
+        error = check_table_times(table_name, times, by_key)
+        if error is None:
+            return None
+        reports.append(error)
+    return reports
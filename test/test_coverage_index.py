@@ -0,0 +1,89 @@
+import datetime
+
+import polars as pl
+import pytest
+
+from shared_code.services import coverage_index
+from shared_code.services.coverage_index import (outside_extent, known_gaps, scan_ranges, query_upper_bound,
+                                                 save_coverage)
+from shared_code.services.timestamp_slots import slot_grid
+
+
+def at(hour, minute=0, day=1):
+    return datetime.datetime(2021, 1, day, hour, minute)
+
+
+def slots(*values):
+    return pl.Series('slot', list(values), dtype=pl.Datetime('us'))
+
+
+# extent 01:00-05:00 with the gaps 02:00-02:10 and 04:00
+coverage = (at(1), at(5), [at(2), at(4)], [at(2, 10), at(4)])
+
+
+@pytest.fixture
+def saved(monkeypatch):
+    # the rows save_coverage would write, without a database
+    rows = []
+    monkeypatch.setattr(coverage_index, 'upsert_coverage', lambda *args: rows.append(args))
+    return rows
+
+
+def test_outside_extent():
+    assert outside_extent(coverage, at(0), at(6), '5min') == ([(at(0), at(0, 55))], [(at(5, 5), at(6))])
+    assert outside_extent(coverage, at(1, 30), at(3), '5min') == ([], [])
+    # a window entirely after the extent is scanned in full
+    assert outside_extent(coverage, at(7), at(8), '5min') == ([], [(at(7), at(8))])
+
+
+def test_known_gaps_are_clipped_to_the_window():
+    assert known_gaps(coverage, at(2, 5), at(3)) == [(at(2, 5), at(2, 10))]
+    assert known_gaps(coverage, at(2, 15), at(3, 55)) == []
+
+
+def test_scan_ranges():
+    assert scan_ranges(None, at(0), at(6), '5min') == [(at(0), at(6))]
+    assert scan_ranges(coverage, at(0), at(6), '5min') == [
+        (at(0), at(0, 55)), (at(2), at(2, 10)), (at(4), at(4)), (at(5, 5), at(6))]
+    # inside the extent only the gaps are read again
+    assert scan_ranges(coverage, at(1), at(5), '5min') == [(at(2), at(2, 10)), (at(4), at(4))]
+
+
+def test_query_upper_bound():
+    assert query_upper_bound(at(1), at(3), '5min') == at(1)
+    assert query_upper_bound(at(1), at(3), '30min') == at(1, 29) + datetime.timedelta(seconds=59, microseconds=999999)
+    # never past the window end
+    assert query_upper_bound(at(1), at(1, 10), '30min') == at(1, 10)
+
+
+def test_save_first_coverage(saved):
+    save_coverage('PRICE', '5min', None, at(1), at(2), slot_grid(at(1), at(2), '5min'),
+                  slots(at(1, 10), at(1, 15), at(1, 40)))
+    assert saved == [('PRICE', '5min', at(1), at(2), [at(1, 10), at(1, 40)], [at(1, 15), at(1, 40)])]
+
+
+def test_save_merges_rescanned_gaps(saved):
+    # 02:00-02:10 was rescanned and 02:05 is still missing, 04:00 was not rescanned
+    scanned = slot_grid(at(2), at(2, 10), '5min')
+    save_coverage('PRICE', '5min', coverage, at(1), at(3), scanned, slots(at(2, 5)))
+    assert saved == [('PRICE', '5min', at(1), at(5), [at(2, 5), at(4)], [at(2, 5), at(4)])]
+
+
+def test_save_extends_the_extent(saved):
+    scanned = slot_grid(at(5, 5), at(6), '5min')
+    save_coverage('PRICE', '5min', coverage, at(4), at(6), scanned, slots(at(5, 55), at(6)))
+    assert saved == [('PRICE', '5min', at(1), at(6), [at(2), at(4), at(5, 55)], [at(2, 10), at(4), at(6)])]
+
+
+def test_save_records_the_hole_before_a_disjoint_window(saved):
+    # nobody scanned 05:05-06:55, it counts as missing until it is
+    scanned = slot_grid(at(7), at(8), '5min')
+    save_coverage('PRICE', '5min', coverage, at(7), at(8), scanned, slots())
+    assert saved == [('PRICE', '5min', at(1), at(8), [at(2), at(4), at(5, 5)], [at(2, 10), at(4), at(6, 55)])]
+
+
+def test_save_records_the_hole_after_an_earlier_window(saved):
+    scanned = slot_grid(at(0), at(0, 30), '5min')
+    save_coverage('PRICE', '5min', coverage, at(0), at(0, 30), scanned, slots(at(0)))
+    assert saved == [('PRICE', '5min', at(0), at(5), [at(0), at(0, 35), at(2), at(4)],
+                      [at(0), at(0, 55), at(2, 10), at(4)])]
@@ -0,0 +1,123 @@
+'''
+Tests against the PostgreSQL of the DB_* variables, skipped when DB_HOST is
+not set. They read the DBO tables of table_column_map and, like the
+incremental engine, write "DBO"."COVERAGE_INDEX": point them at a test database.
+'''
+import asyncio
+import datetime
+import json
+import os
+
+import pytest
+
+from shared_code.services.validation import engines, key_engines, table_column_map
+
+pytestmark = pytest.mark.skipif(not os.getenv('DB_HOST'), reason='needs a PostgreSQL in DB_HOST')
+
+if os.getenv('DB_HOST'):
+    from shared_code.common.db import connection
+    from shared_code.repository.dbo_transactions import query_timestamp, query_timestamp_ranges, timestamp_query
+    from shared_code.services.report_ronding_time import run, run_async
+
+
+def to_string(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def table_window(table_name, days=3):
+    # a window at the start of the table's data, None for an empty table
+    column = table_column_map[table_name][0]
+    first = connection.executeSQL(f'SELECT min("{column}") FROM "DBO"."{table_name}"')[0][0]
+    if first is None:
+        return None
+    start = first.replace(minute=0, second=0, microsecond=0)
+    return start, start + datetime.timedelta(days=days)
+
+
+@pytest.fixture(scope='module')
+def table_times():
+    times = {}
+    for table_name in ('PRICE', 'PREDISPATCHPRICE', 'STPASA_REGIONSOLUTION'):
+        window = table_window(table_name)
+        if window is not None:
+            times[table_name] = {'start_datetime': to_string(window[0]), 'end_datetime': to_string(window[1])}
+    if not times:
+        pytest.skip('the DBO tables are empty')
+    return times
+
+
+@pytest.fixture
+def scratch():
+    # a temporary table on the connection bulk_insert writes through
+    connection.executeSQL('DROP TABLE IF EXISTS pg_temp.bulk_t', is_result=False)
+    connection.executeSQL('CREATE TEMPORARY TABLE bulk_t (id int PRIMARY KEY, flag boolean, data bytea, '
+                          'numbers int[], words text[], doc jsonb)', is_result=False)
+    yield
+    connection.executeSQL('DROP TABLE IF EXISTS pg_temp.bulk_t', is_result=False)
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_engines_match_python(table_times, engine):
+    expected = json.loads(run(table_times, use_cache=False))
+    assert json.loads(run(table_times, engine=engine, use_cache=False)) == expected
+    assert json.loads(asyncio.run(run_async(table_times, engine=engine, concurrent=True, use_cache=False))) == expected
+
+
+@pytest.mark.parametrize('engine', key_engines)
+def test_key_engines_match_python(table_times, engine):
+    expected = json.loads(run(table_times, use_cache=False, by_key=True))
+    assert json.loads(run(table_times, engine=engine, use_cache=False, by_key=True)) == expected
+
+
+def test_incremental_over_overlapping_windows(table_times):
+    # every window folds into the coverage index, later windows read parts of it
+    table_name, times = next(iter(table_times.items()))
+    start = datetime.datetime.strptime(times['start_datetime'], '%Y-%m-%d %H:%M:%S.%f')
+    for first_day, last_day in ((1, 2), (0, 1), (0, 3), (2, 4)):
+        window = {table_name: {'start_datetime': to_string(start + datetime.timedelta(days=first_day)),
+                               'end_datetime': to_string(start + datetime.timedelta(days=last_day))}}
+        expected = json.loads(run(window, use_cache=False))
+        assert json.loads(run(window, engine='incremental', use_cache=False)) == expected
+
+
+def test_query_timestamp_ranges(table_times):
+    table_name, times = next(iter(table_times.items()))
+    column = table_column_map[table_name][0]
+    start = datetime.datetime.strptime(times['start_datetime'], '%Y-%m-%d %H:%M:%S.%f')
+    ranges = [(start, start + datetime.timedelta(hours=2)),
+              (start + datetime.timedelta(days=1), start + datetime.timedelta(days=1, hours=5))]
+    expected = {row[0] for low, high in ranges for row in query_timestamp(column, table_name, low, high)}
+    assert {row[0] for row in query_timestamp_ranges(column, table_name, ranges)} == expected
+    # the same statement whatever the number of ranges
+    assert {row[0] for row in query_timestamp_ranges(column, table_name, ranges[:1])} == {
+        row[0] for row in query_timestamp(column, table_name, *ranges[0])}
+
+
+def test_query_to_polars_with_and_without_schema(table_times):
+    table_name, times = next(iter(table_times.items()))
+    column = table_column_map[table_name][0]
+    query, params = timestamp_query(column, table_name), (times['start_datetime'], times['end_datetime'])
+    described = connection.query_to_polars(query, params)
+    assert connection.query_to_polars(query, params, schema={column: 'timestamp'}).equals(described)
+    assert sorted(described[column].to_list()) == sorted(row[0] for row in connection.execute_prepared(query, params))
+
+
+@pytest.mark.parametrize('rows', [3, 60000])
+def test_bulk_insert_round_trip(scratch, rows):
+    # below copy_threshold through execute_values, at or above it through COPY
+    values = [(i, i % 2 == 0, bytes([i % 256, 0]), [i, None], ['a "b"', 'c\\d,e'], json.dumps({'i': i, 'v': [None]}))
+              for i in range(rows)]
+    connection.bulk_insert('bulk_t', 'pg_temp', 'id, flag, data, numbers, words, doc', values,
+                           type_value='%s, %s, %s, %s, %s, %s::jsonb')
+    loaded = connection.executeSQL('SELECT id, flag, data, numbers, words, doc FROM pg_temp.bulk_t ORDER BY id')
+    assert [(i, flag, bytes(data), numbers, words, json.dumps(doc))
+            for i, flag, data, numbers, words, doc in loaded] == values
+
+
+@pytest.mark.parametrize('rows', [3, 60000])
+def test_bulk_insert_is_atomic(scratch, rows):
+    values = [(i, True, None, None, None, None) for i in range(rows)]
+    values.append((0, False, None, None, None, None))
+    with pytest.raises(Exception):
+        connection.bulk_insert('bulk_t', 'pg_temp', 'id, flag, data, numbers, words, doc', values)
+    assert connection.executeSQL('SELECT count(*) FROM pg_temp.bulk_t') == [(0,)]
@@ -0,0 +1,89 @@
+import csv
+import datetime
+import decimal
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from shared_code.common.database_Util import (cast_column, encode_csv, csv_value, array_literal, IteratorFile,
+                                              iter_batches, numbered_placeholders)
+
+
+def test_cast_column_typed_columns():
+    dates = cast_column(pd.Series([pd.Timestamp('2021-01-01 00:05:00.123456'), pd.NaT]))
+    assert list(dates) == [datetime.datetime(2021, 1, 1, 0, 5, 0, 123456), None]
+
+    ints = cast_column(pd.Series([1, 2], dtype='int64'))
+    assert ints == [1, 2] and all(type(value) is int for value in ints)
+
+    floats = cast_column(pd.Series([1.5, np.nan]))
+    assert list(floats) == [1.5, None] and type(floats[0]) is float
+
+
+def test_cast_column_keeps_bools():
+    # an integer is not accepted for a boolean column by execute_values
+    flags = cast_column(pd.Series([True, False]))
+    assert flags == [True, False] and all(type(value) is bool for value in flags)
+
+    mixed = cast_column(pd.Series([np.bool_(True), None, 3], dtype=object))
+    assert list(mixed) == [True, None, 3] and type(mixed[0]) is bool
+
+
+def test_cast_column_object_columns():
+    values = cast_column(pd.Series(['a', '-', None, decimal.Decimal('1.5')], dtype=object))
+    assert list(values) == ['a', 0, None, decimal.Decimal('1.5')]
+
+    # numpy scalars and Timestamps go through pass_type_value
+    values = cast_column(pd.Series([np.int64(3), np.float64(2.5), pd.Timestamp('2021-01-01')], dtype=object))
+    assert list(values) == [3, 2.5, datetime.datetime(2021, 1, 1)]
+    assert [type(value) for value in values] == [int, float, datetime.datetime]
+
+    # nullable extension dtypes
+    assert list(cast_column(pd.Series([1, None], dtype='Int64'))) == [1, None]
+
+
+def test_array_literal():
+    assert array_literal([]) == '{}'
+    assert array_literal([1, None, 'a b']) == '{"1",NULL,"a b"}'
+    assert array_literal(['say "hi"', 'back\\slash']) == '{"say \\"hi\\"","back\\\\slash"}'
+    assert array_literal([[1, 2], [3, 4]]) == '{{"1","2"},{"3","4"}}'
+    assert array_literal([datetime.datetime(2021, 1, 1)]) == '{"2021-01-01 00:00:00"}'
+
+
+def test_csv_value():
+    assert csv_value(b'\x00\xff') == '\\x00ff'
+    assert csv_value(['a']) == '{"a"}'
+    assert csv_value({'a': [1, None]}) == '{"a": [1, null]}'
+    assert csv_value(3) == 3
+
+
+def test_encode_csv_round_trips_through_the_csv_reader():
+    rows = [(1, None, '', 'a,"b"\nc', b'\x01', ['x', 'y'], {'k': 'v'}, True)]
+    text = encode_csv(rows).decode('utf8')
+    # NULL is an unquoted \N, the empty string stays an empty field
+    assert text.startswith('1,\\N,,')
+    assert list(csv.reader(StringIO(text))) == [
+        ['1', '\\N', '', 'a,"b"\nc', '\\x01', '{"x","y"}', '{"k": "v"}', 'True']]
+
+
+def test_iterator_file():
+    reader = IteratorFile(iter([b'abc', b'', b'defg', b'h']))
+    assert reader.read(2) == b'ab'
+    assert reader.read(3) == b'cde'
+    assert reader.read(0) == b''
+    assert reader.read(-1) == b'fgh'
+    assert reader.read(10) == b''
+
+    assert IteratorFile([b'12', b'34']).read() == b'1234'
+
+
+def test_iter_batches():
+    assert list(iter_batches([1, 2, 3, 4, 5], 2)) == [[1, 2], [3, 4], [5]]
+    frame = pd.DataFrame({'a': range(5)})
+    assert [len(batch) for batch in iter_batches(frame, 3)] == [3, 2]
+
+
+def test_numbered_placeholders():
+    assert numbered_placeholders('SELECT %s, %s FROM t WHERE a = %s') == 'SELECT $1, $2 FROM t WHERE a = $3'
+    assert numbered_placeholders('SELECT 1') == 'SELECT 1'
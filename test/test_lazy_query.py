@@ -0,0 +1,82 @@
+import pytest
+
+from shared_code.common.lazy_query import LazyQuery
+
+
+def price():
+    # database is only used by collect()
+    return LazyQuery(None, '"DBO"."PRICE"', columns=['SETTLEMENTDATE', 'REGIONID', 'RRP'])
+
+
+def test_plain_read():
+    assert price().sql() == ('SELECT * FROM "DBO"."PRICE"', [])
+
+
+def test_filter_select_sort_limit_merge_into_one_statement():
+    query = (price().filter('SETTLEMENTDATE', 'between', ('2021-01-01', '2021-01-02'))
+             .filter('REGIONID', 'in', ['NSW1', 'VIC1'])
+             .select('SETTLEMENTDATE', 'RRP')
+             .sort('SETTLEMENTDATE', descending=True)
+             .limit(10).limit(20))
+    assert query.sql() == (
+        'SELECT "SETTLEMENTDATE", "RRP" FROM "DBO"."PRICE"'
+        ' WHERE "SETTLEMENTDATE" BETWEEN %s AND %s AND "REGIONID" IN %s'
+        ' ORDER BY "SETTLEMENTDATE" DESC LIMIT %s',
+        ['2021-01-01', '2021-01-02', ('NSW1', 'VIC1'), 10],
+    )
+
+
+def test_empty_in():
+    assert price().filter('REGIONID', 'in', []).sql() == ('SELECT * FROM "DBO"."PRICE" WHERE FALSE', [])
+    assert price().filter('REGIONID', 'not in', []).sql() == ('SELECT * FROM "DBO"."PRICE" WHERE TRUE', [])
+
+
+def test_group_by_agg():
+    query = price().filter('RRP', 'is not null').group_by('REGIONID').agg(rows=('count', '*'), top=('max', 'RRP'))
+    assert query.sql() == (
+        'SELECT "REGIONID", count(*) AS "rows", max("RRP") AS "top" FROM "DBO"."PRICE"'
+        ' WHERE "RRP" IS NOT NULL GROUP BY "REGIONID"',
+        [],
+    )
+
+
+def test_filter_after_agg_wraps_a_subquery():
+    query = price().group_by('REGIONID').agg(rows=('count', '*')).filter('rows', '>', 5)
+    assert query.sql() == (
+        'SELECT * FROM (SELECT "REGIONID", count(*) AS "rows" FROM "DBO"."PRICE" GROUP BY "REGIONID") AS q0'
+        ' WHERE "rows" > %s',
+        [5],
+    )
+
+
+def test_params_of_a_subquery_come_first():
+    query = price().filter('RRP', '>', 1).limit(3).filter('RRP', '<', 9)
+    assert query.sql() == (
+        'SELECT * FROM (SELECT * FROM "DBO"."PRICE" WHERE "RRP" > %s LIMIT %s) AS q0 WHERE "RRP" < %s',
+        [1, 3, 9],
+    )
+
+
+def test_sort_moves_out_of_a_subquery_without_limit():
+    query = price().sort('REGIONID').group_by('REGIONID').agg(rows=('count', '*'))
+    # an aggregation keeps no row order
+    assert 'ORDER BY' not in query.sql()[0]
+
+    query = price().select('REGIONID', 'RRP').sort('RRP').unique().sort('REGIONID')
+    assert query.sql() == ('SELECT DISTINCT "REGIONID", "RRP" FROM "DBO"."PRICE" ORDER BY "REGIONID"', [])
+
+
+def test_unknown_column_and_operator():
+    with pytest.raises(ValueError, match='unknown columns NOPE'):
+        price().filter('NOPE', '=', 1)
+    with pytest.raises(ValueError, match='unknown operator'):
+        price().filter('RRP', '~', 1)
+    with pytest.raises(ValueError, match='unknown columns RRP'):
+        price().select('REGIONID').sort('RRP')
+    with pytest.raises(ValueError, match='group_by needs an agg'):
+        price().group_by('REGIONID').sql()
+
+
+def test_quoted_identifiers():
+    query = LazyQuery(None, '"DBO"."T"', columns=['a"b']).select('a"b')
+    assert query.sql() == ('SELECT "a""b" FROM "DBO"."T"', [])
@@ -0,0 +1,49 @@
+import datetime
+
+import pytest
+
+from shared_code.services.partitioned_scan import window_partitions
+from shared_code.services.timestamp_slots import slot_grid, frequency_step_map
+
+
+def check_partitions(partitions, start, end, frequency):
+    # together the partitions are the grid of [start, end], each slot in exactly one of them
+    grid = slot_grid(start, end, frequency).to_list()
+    covered = [slot for first, last in partitions for slot in slot_grid(first, last, frequency).to_list()]
+    assert covered == grid
+    step = frequency_step_map[frequency]
+    for (_, last), (first, _) in zip(partitions, partitions[1:]):
+        assert first == last + step
+
+
+def test_one_month_is_one_partition():
+    start, end = datetime.datetime(2021, 1, 3), datetime.datetime(2021, 1, 20)
+    assert window_partitions(start, end, '5min') == [(start, end)]
+
+
+def test_split_at_month_starts():
+    start, end = datetime.datetime(2021, 1, 15), datetime.datetime(2021, 3, 10)
+    assert window_partitions(start, end, 'H') == [
+        (start, datetime.datetime(2021, 1, 31, 23)),
+        (datetime.datetime(2021, 2, 1), datetime.datetime(2021, 2, 28, 23)),
+        (datetime.datetime(2021, 3, 1), end),
+    ]
+
+
+def test_window_ending_on_a_month_start():
+    start, end = datetime.datetime(2021, 1, 15), datetime.datetime(2021, 2, 1)
+    assert window_partitions(start, end, 'H') == [
+        (start, datetime.datetime(2021, 1, 31, 23)),
+        (end, end),
+    ]
+
+
+@pytest.mark.parametrize('start, end, frequency', [
+    # the grid is anchored at start, the month boundary moves to the next slot
+    (datetime.datetime(2021, 1, 30, 0, 7), datetime.datetime(2021, 3, 2), '30min'),
+    (datetime.datetime(2020, 12, 31, 23, 58), datetime.datetime(2021, 2, 1, 0, 2), '5min'),
+    (datetime.datetime(2021, 1, 31, 23, 59, 59), datetime.datetime(2021, 2, 1, 0, 30), 'H'),
+    (datetime.datetime(2021, 1, 1), datetime.datetime(2021, 12, 31, 23, 55), '5min'),
+])
+def test_partitions_cover_the_grid(start, end, frequency):
+    check_partitions(window_partitions(start, end, frequency), start, end, frequency)
@@ -0,0 +1,88 @@
+import datetime
+
+import polars as pl
+
+from shared_code.services.timestamp_slots import (missing_slots, missing_key_slots, slot_runs, compress_slots,
+                                                  compress_key_slots, format_key_slots, expand_runs, floor_slot,
+                                                  last_slot, is_aligned)
+
+
+def at(hour, minute=0, second=0):
+    return datetime.datetime(2021, 1, 1, hour, minute, second)
+
+
+def present(*pairs):
+    return pl.DataFrame({'REGIONID': [key for key, _ in pairs], 'SETTLEMENTDATE': [value for _, value in pairs]},
+                        schema={'REGIONID': pl.Utf8, 'SETTLEMENTDATE': pl.Datetime('us')})
+
+
+def pairs(frame):
+    return list(zip(frame['key'].to_list(), frame['slot'].to_list()))
+
+
+def test_missing_slots():
+    rows = pl.DataFrame({'SETTLEMENTDATE': [at(0), at(0, 10), at(0, 10)]})
+    assert missing_slots(rows, '5min', at(0), at(0, 15)).to_list() == [at(0, 5), at(0, 15)]
+    assert missing_slots(None, 'H', at(0), at(2)).to_list() == [at(0), at(1), at(2)]
+
+
+def test_missing_slots_buckets_30min_rows():
+    # LASTCHANGED is stamped a few minutes into its half hour
+    rows = pl.DataFrame({'LASTCHANGED': [at(0, 7), at(1, 29, 59)]})
+    assert missing_slots(rows, '30min', at(0), at(1, 30)).to_list() == [at(0, 30), at(1, 30)]
+
+
+def test_missing_key_slots_numbers_pairs_per_key():
+    rows = present(('NSW1', at(0)), ('NSW1', at(0, 5)), ('NSW1', at(0, 10)), ('VIC1', at(0, 5)))
+    missing = missing_key_slots(rows, '5min', at(0), at(0, 10), ['VIC1', 'NSW1'])
+    # sorted by key then slot, the last slot of one key and the first of the next stay apart
+    assert pairs(missing) == [('VIC1', at(0)), ('VIC1', at(0, 10))]
+
+
+def test_missing_key_slots_reports_keys_without_rows():
+    rows = present(('NSW1', at(0)), ('NSW1', at(0, 5)))
+    missing = missing_key_slots(rows, '5min', at(0), at(0, 5), ['NSW1', 'QLD1', 'NSW1'])
+    assert pairs(missing) == [('QLD1', at(0)), ('QLD1', at(0, 5))]
+    # a table without any row in the window is missing every expected pair
+    assert len(missing_key_slots(present(), '5min', at(0), at(0, 5), ['NSW1', 'QLD1'])) == 4
+
+
+def test_missing_key_slots_ignores_other_keys_and_rows_off_the_grid():
+    rows = present(('NSW1', at(0)), ('NSW1', at(0, 7)), ('NSW1', at(0, 15)), ('SA1', at(0, 5)))
+    missing = missing_key_slots(rows, '5min', at(0), at(0, 10), ['NSW1'])
+    assert pairs(missing) == [('NSW1', at(0, 5)), ('NSW1', at(0, 10))]
+
+
+def test_missing_key_slots_buckets_30min_rows():
+    rows = present(('NSW1', at(0, 7)), ('NSW1', at(0, 45)))
+    missing = missing_key_slots(rows, '30min', at(0), at(1), ['NSW1'])
+    assert pairs(missing) == [('NSW1', at(1))]
+
+
+def test_slot_runs_and_expand_runs():
+    slots = pl.Series('slot', [at(0), at(0, 5), at(0, 10), at(1), at(2), at(2, 5)], dtype=pl.Datetime('us'))
+    runs = slot_runs(slots, '5min')
+    assert runs['start'].to_list() == [at(0), at(1), at(2)]
+    assert runs['end'].to_list() == [at(0, 10), at(1), at(2, 5)]
+    assert runs['count'].to_list() == [3, 1, 2]
+    assert expand_runs(runs['start'].to_list(), runs['end'].to_list(), '5min').to_list() == slots.to_list()
+    assert compress_slots(slots.head(2), '5min') == [
+        {'start': '2021-01-01T00:00:00', 'end': '2021-01-01T00:05:00', 'count': 2}]
+
+
+def test_key_formats():
+    missing = pl.DataFrame({'key': ['NSW1', 'NSW1', 'VIC1'], 'slot': [at(0), at(0, 5), at(0, 5)]},
+                           schema={'key': pl.Utf8, 'slot': pl.Datetime('us')})
+    assert format_key_slots(missing) == {'NSW1': ['2021-01-01T00:00:00', '2021-01-01T00:05:00'],
+                                         'VIC1': ['2021-01-01T00:05:00']}
+    # a run ends where the key changes even when the slots are consecutive
+    assert compress_key_slots(missing, '5min') == {
+        'NSW1': [{'start': '2021-01-01T00:00:00', 'end': '2021-01-01T00:05:00', 'count': 2}],
+        'VIC1': [{'start': '2021-01-01T00:05:00', 'end': '2021-01-01T00:05:00', 'count': 1}],
+    }
+
+
+def test_grid_helpers():
+    assert floor_slot(at(0, 29, 59), '30min') == at(0)
+    assert last_slot(at(0, 7), at(1), '30min') == at(0, 37)
+    assert is_aligned(at(1), 'H') and not is_aligned(at(1, 5), '30min')